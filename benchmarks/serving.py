@@ -0,0 +1,92 @@
+"""Smoke benchmark: requests/sec of one endpoint under concurrent load.
+
+Point it at two running servers to compare serving setups, e.g. the
+development ``runserver`` and the production gunicorn profile::
+
+    python benchmarks/serving.py --token "$ACCESS" \\
+        http://localhost:8000/api/post/Post/ http://localhost:8001/api/post/Post/
+
+Only the standard library is used so it runs outside the app's virtualenv.
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def worker(url, headers, deadline, latencies, errors):
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parts.netloc, timeout=30)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def run(url, concurrency, duration, headers):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=worker, args=(url, headers, deadline, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        "url": url,
+        "requests/s": len(latencies) / duration,
+        "p50 ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99 ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--token", help="JWT access token sent as a Bearer header")
+    args = parser.parse_args()
+
+    headers = {"Accept-Encoding": "gzip"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    results = []
+    for url in args.urls:
+        run(url, args.concurrency, args.warmup, headers)
+        results.append(run(url, args.concurrency, args.duration, headers))
+
+    print(f"{'requests/s':>12} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}  url")
+    for result in results:
+        print(
+            f"{result['requests/s']:>12.1f} {result['p50 ms']:>8.1f} "
+            f"{result['p99 ms']:>8.1f} {result['errors']:>7}  {result['url']}"
+        )
+    if len(results) > 1 and results[0]["requests/s"]:
+        print(f"speedup: {results[-1]['requests/s'] / results[0]['requests/s']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
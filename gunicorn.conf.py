@@ -0,0 +1,31 @@
+"""Gunicorn settings for ``SERVING_PROFILE=production``.
+
+``SERVER_INTERFACE=asgi`` runs ``social_media.asgi`` on uvicorn workers;
+the default serves ``social_media.wsgi`` with threaded workers.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+
+if os.environ.get("SERVER_INTERFACE") == "asgi":
+    wsgi_app = "social_media.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "social_media.wsgi:application"
+    worker_class = "gthread"
+    threads = int(os.environ.get("WEB_THREADS", 4))
+
+# Recycle workers now and then so leaks and stale state cannot pile up.
+max_requests = 2000
+max_requests_jitter = 200
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Import Django once in the master so workers fork with it loaded.
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
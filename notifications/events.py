@@ -0,0 +1,175 @@
+"""Grouped notifications, written off the request path.
+
+Signal handlers only append an event to ``notification_buffer`` once the
+request's transaction commits. The buffer is flushed on the background pool
+``NOTIFICATION_FLUSH_INTERVAL`` seconds after its first event, or as soon as
+it holds ``NOTIFICATION_FLUSH_SIZE`` events. A flush groups events by
+recipient, verb, post and ``NOTIFICATION_WINDOW_SECONDS`` window and writes
+each group with one ``INSERT ... ON CONFLICT DO UPDATE`` row that adds to
+the ``actor_count`` of the window's notification, so a post liked ten
+thousand times in a window is a single "X and 9,999 others liked your post"
+row, updated at most once per flush.
+
+``actor_count`` counts events, with each actor once per flush: someone who
+unlikes and likes again in another flush counts twice.
+
+Unread counts are cached per user and moved with ``incr``/``decr`` as
+notifications turn unread or read, so the badge never counts rows.
+"""
+import atexit
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from post.models import Comment, Post
+from social_media.tasks import enqueue_later
+from .models import Notification
+
+UNREAD_COUNT_KEY = "notifications:unread:{}"
+
+Event = namedtuple("Event", "verb actor_id post_id parent_id recipient_id at")
+
+
+class NotificationBuffer:
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        with self._lock:
+            self._events.append(event)
+            size = len(self._events)
+        if size == settings.NOTIFICATION_FLUSH_SIZE:
+            enqueue_later(0, self.flush)
+        elif size == 1:
+            enqueue_later(settings.NOTIFICATION_FLUSH_INTERVAL, self.flush)
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        write_notifications(events)
+
+
+notification_buffer = NotificationBuffer()
+atexit.register(notification_buffer.flush)
+
+
+def record(verb, actor_id, post_id=None, parent_id=None, recipient_id=None):
+    """Queue a notification once the current transaction commits.
+
+    Without ``recipient_id`` it goes to the author of ``parent_id`` (a
+    comment) or else of ``post_id``, looked up when the buffer is flushed.
+    """
+    event = Event(verb, actor_id, post_id, parent_id, recipient_id, timezone.now())
+    transaction.on_commit(lambda: notification_buffer.add(event))
+
+
+def window_start(when):
+    timestamp = int(when.timestamp())
+    return datetime.fromtimestamp(
+        timestamp - timestamp % settings.NOTIFICATION_WINDOW_SECONDS, tz=dt_timezone.utc
+    )
+
+
+def _group(events):
+    """``{(recipient_id, verb, post_id, window): {actor_id: at}}``; self-actions are dropped."""
+    post_authors = dict(Post.objects.filter(
+        pk__in={event.post_id for event in events if event.recipient_id is None and event.parent_id is None}
+    ).values_list("pk", "author_id"))
+    comment_authors = dict(Comment.objects.filter(
+        pk__in={event.parent_id for event in events if event.recipient_id is None and event.parent_id}
+    ).values_list("pk", "author_id"))
+
+    groups = {}
+    for event in events:
+        recipient_id = event.recipient_id
+        if recipient_id is None:
+            authors, key = (comment_authors, event.parent_id) if event.parent_id else (post_authors, event.post_id)
+            recipient_id = authors.get(key)
+        if recipient_id is None or recipient_id == event.actor_id:
+            continue
+        actors = groups.setdefault((recipient_id, event.verb, event.post_id, window_start(event.at)), {})
+        actors[event.actor_id] = max(event.at, actors.get(event.actor_id, event.at))
+    return groups
+
+
+def write_notifications(events):
+    groups = _group(events)
+    if not groups:
+        return
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    # Sorted, so concurrent flushes lock shared rows in the same order.
+    keys = sorted(groups, key=lambda key: (key[0], key[1], key[2] or 0, key[3]))
+    rows = []
+    for key in keys:
+        actors = groups[key]
+        last_actor_id = max(actors, key=actors.get)
+        rows.append((*key, last_actor_id, len(actors), actors[last_actor_id]))
+    group_key = "(recipient_id, verb, COALESCE(post_id, 0), bucket)"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Lock the existing rows first, so none is marked read in between:
+        # read notifications reopened here add to the unread counts as much
+        # as new ones.
+        cursor.execute(
+            f"SELECT id, is_read FROM {table} WHERE {group_key} IN ({', '.join(['(%s, %s, %s, %s)'] * len(rows))}) "
+            f"ORDER BY id FOR UPDATE",
+            [value for recipient_id, verb, post_id, bucket, *_ in rows
+             for value in (recipient_id, verb, post_id or 0, bucket)],
+        )
+        reopened = {pk for pk, is_read in cursor.fetchall() if is_read}
+        cursor.execute(
+            f"INSERT INTO {table} (recipient_id, verb, post_id, bucket, last_actor_id, actor_count, "
+            f"updated_at, is_read) VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, false)'] * len(rows))} "
+            f"ON CONFLICT {group_key} DO UPDATE SET "
+            f"actor_count = {table}.actor_count + EXCLUDED.actor_count, "
+            f"last_actor_id = EXCLUDED.last_actor_id, "
+            f"updated_at = GREATEST({table}.updated_at, EXCLUDED.updated_at), "
+            f"is_read = false "
+            f"RETURNING id, recipient_id, xmax = 0",
+            [value for row in rows for value in row],
+        )
+        unread = {}
+        for pk, recipient_id, inserted in cursor.fetchall():
+            if inserted or pk in reopened:
+                unread[recipient_id] = unread.get(recipient_id, 0) + 1
+    transaction.on_commit(lambda: _change_unread_counts(unread))
+
+
+def _change_unread_counts(deltas):
+    for user_id, delta in deltas.items():
+        try:
+            cache.incr(UNREAD_COUNT_KEY.format(user_id), delta)
+        except ValueError:
+            # Not cached: the next read counts from the table.
+            pass
+
+
+def unread_count(user_id):
+    key = UNREAD_COUNT_KEY.format(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.add(key, count, settings.NOTIFICATION_UNREAD_CACHE_TIMEOUT)
+    return max(count, 0)
+
+
+def mark_read(user_id, ids=None):
+    """Mark the user's notifications (or those of ``ids``) read; returns how many changed."""
+    notifications = Notification.objects.filter(recipient_id=user_id, is_read=False)
+    if ids is not None:
+        notifications = notifications.filter(pk__in=ids)
+    changed = notifications.update(is_read=True)
+    if changed:
+        transaction.on_commit(lambda: _change_unread_counts({user_id: -changed}))
+    return changed
+
+
+def forget_unread(user_id, count=1):
+    """Take deleted unread notifications off the cached count."""
+    transaction.on_commit(lambda: _change_unread_counts({user_id: -count}))
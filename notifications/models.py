@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
+
+
+class Notification(models.Model):
+    """Everyone who did ``verb`` to one post (or account) of ``recipient``
+    within one ``NOTIFICATION_WINDOW_SECONDS`` window, as a single row."""
+
+    class Verb(models.TextChoices):
+        LIKE = "like"
+        COMMENT = "comment"
+        REPLY = "reply"
+        FOLLOW = "follow"
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="notifications", db_index=False
+    )
+    verb = models.CharField(max_length=10, choices=Verb.choices)
+    # The liked or commented post; null for follows.
+    post = models.ForeignKey("post.Post", on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    bucket = models.DateTimeField()
+    last_actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    actor_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            # Follows have no post, and NULLs never conflict in a unique index.
+            models.UniqueConstraint(
+                "recipient", "verb", Coalesce("post", Value(0)), "bucket", name="unique_notification_group"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["recipient", "-updated_at", "-id"], name="notification_recipient_idx"),
+            models.Index(fields=["recipient"], condition=Q(is_read=False), name="notification_unread_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient_id}: {self.verb} x{self.actor_count}"
@@ -0,0 +1,37 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from .models import Notification
+
+PHRASES = {
+    Notification.Verb.LIKE: "liked your post",
+    Notification.Verb.COMMENT: "commented on your post",
+    Notification.Verb.REPLY: "replied to your comment",
+    Notification.Verb.FOLLOW: "followed you",
+}
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    actor = serializers.SlugRelatedField(source="last_actor", slug_field="email", read_only=True)
+    message = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = ("id", "verb", "post", "actor", "actor_count", "message", "is_read", "updated_at")
+
+    def get_message(self, notification):
+        actor = notification.last_actor
+        name = (actor.get_full_name() or actor.email) if actor else "Someone"
+        others = notification.actor_count - 1
+        if others > 0:
+            name += f" and {others:,} {'other' if others == 1 else 'others'}"
+        return f"{name} {PHRASES[notification.verb]}"
+
+
+class MarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_IDS,
+        required=False,
+    )
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from post.likes import post_liked
+from post.models import Comment
+from user.follows import follow_created, follows_created
+from . import events
+from .models import Notification
+
+
+@receiver(post_liked)
+def notify_like(sender, post_id, user_id, **kwargs):
+    events.record(Notification.Verb.LIKE, user_id, post_id=post_id)
+
+
+@receiver(post_save, sender=Comment)
+def notify_comment(sender, instance, created, **kwargs):
+    if not created:
+        return
+    verb = Notification.Verb.REPLY if instance.parent_id else Notification.Verb.COMMENT
+    events.record(verb, instance.author_id, post_id=instance.post_id, parent_id=instance.parent_id)
+
+
+@receiver(follow_created)
+def notify_follow(sender, follower_id, followee_id, **kwargs):
+    events.record(Notification.Verb.FOLLOW, follower_id, recipient_id=followee_id)
+
+
+@receiver(follows_created)
+def notify_follows(sender, follower_id, followee_ids, **kwargs):
+    for followee_id in sorted(followee_ids):
+        events.record(Notification.Verb.FOLLOW, follower_id, recipient_id=followee_id)
+
+
+@receiver(post_delete, sender=Notification)
+def forget_deleted_unread(sender, instance, **kwargs):
+    if not instance.is_read:
+        events.forget_unread(instance.recipient_id)
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from post import likes
+from post.models import Comment, Post
+from user.follows import follow
+from . import events
+from .models import Notification
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class NotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+        self.fans = [
+            get_user_model().objects.create_user(email=f"fan{i}@email.com", password="testpass")
+            for i in range(3)
+        ]
+
+    def notifications(self):
+        response = self.client.get(reverse("notifications:notification-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def unread(self):
+        return self.client.get(reverse("notifications:notification-unread-count")).data["unread"]
+
+    def test_likes_in_a_window_coalesce_into_one_notification(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for fan in self.fans:
+                likes.like_post(self.post.id, fan.id)
+            likes.like_post(self.post.id, self.user.id)
+
+        (notification,) = self.notifications()
+        self.assertEqual(notification["verb"], "like")
+        self.assertEqual(notification["post"], self.post.id)
+        self.assertEqual(notification["actor_count"], 3)
+        self.assertEqual(notification["actor"], "fan2@email.com")
+        self.assertEqual(notification["message"], "fan2@email.com and 2 others liked your post")
+
+    def test_flush_writes_one_row_per_group(self):
+        now = timezone.now()
+        batch = [
+            events.Event(Notification.Verb.LIKE, fan.id, self.post.id, None, None, now + timedelta(seconds=i))
+            for i, fan in enumerate(self.fans * 2)
+        ]
+        batch.append(events.Event(Notification.Verb.FOLLOW, self.fans[0].id, None, None, self.user.id, now))
+        # The post authors, then the lock and the upsert in a savepoint.
+        with self.assertNumQueries(5):
+            events.write_notifications(batch)
+
+        notifications = Notification.objects.filter(recipient=self.user)
+        self.assertEqual(
+            {(n.verb, n.post_id, n.actor_count) for n in notifications},
+            {("like", self.post.id, 3), ("follow", None, 1)},
+        )
+
+    def test_new_window_starts_a_new_notification(self):
+        now = timezone.now()
+        later = now + timedelta(seconds=settings.NOTIFICATION_WINDOW_SECONDS)
+        for when in (now, later):
+            events.write_notifications([events.Event("like", self.fans[0].id, self.post.id, None, None, when)])
+        self.assertEqual(Notification.objects.filter(recipient=self.user).count(), 2)
+
+    def test_comments_replies_and_follows(self):
+        fan = self.fans[0]
+        comment = Comment.objects.create(author=self.user, post=self.post, content="mine")
+        other = Post.objects.create(author=fan, content="theirs")
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(author=fan, post=self.post, content="nice")
+            Comment.objects.create(author=fan, post=other, content="own post")
+            Comment.objects.create(author=fan, post=self.post, parent=comment, content="reply")
+            follow(fan.id, self.user.id)
+
+        messages = {item["verb"]: item["message"] for item in self.notifications()}
+        self.assertEqual(messages, {
+            "comment": "fan0@email.com commented on your post",
+            "reply": "fan0@email.com replied to your comment",
+            "follow": "fan0@email.com followed you",
+        })
+
+    def test_unread_count_is_served_from_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like_post(self.post.id, self.fans[0].id)
+        self.assertEqual(self.unread(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            follow(self.fans[0].id, self.user.id)
+            likes.like_post(self.post.id, self.fans[1].id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.unread(), 2)
+
+    def test_mark_read_and_reopen(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like_post(self.post.id, self.fans[0].id)
+            follow(self.fans[0].id, self.user.id)
+        self.assertEqual(self.unread(), 2)
+        like = Notification.objects.get(verb="like")
+
+        url = reverse("notifications:notification-read")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"ids": [like.id]}, format="json")
+        self.assertEqual(response.data, {"read": 1})
+        self.assertEqual(self.unread(), 1)
+
+        # Another like in the same window reopens the read notification.
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like_post(self.post.id, self.fans[1].id)
+        self.assertEqual(self.unread(), 2)
+        like.refresh_from_db()
+        self.assertEqual((like.is_read, like.actor_count, like.last_actor_id), (False, 2, self.fans[1].id))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.data, {"read": 2})
+        self.assertEqual(self.unread(), 0)
+        self.assertFalse(Notification.objects.filter(is_read=False).exists())
+
+    def test_deleting_a_post_drops_its_unread_notifications(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like_post(self.post.id, self.fans[0].id)
+        self.assertEqual(self.unread(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.assertEqual(self.unread(), 0)
+
+    def test_notifications_are_private(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.like_post(self.post.id, self.fans[0].id)
+        self.client.force_authenticate(user=self.fans[0])
+        self.assertEqual(self.notifications(), [])
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse("notifications:notification-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_events_are_buffered_until_flushed(self):
+        with override_settings(BACKGROUND_TASKS_EAGER=False), \
+                mock.patch.object(events, "enqueue_later") as enqueue_later:
+            with self.captureOnCommitCallbacks(execute=True):
+                for fan in self.fans:
+                    likes.like_post(self.post.id, fan.id)
+            enqueue_later.assert_called_once_with(
+                settings.NOTIFICATION_FLUSH_INTERVAL, events.notification_buffer.flush
+            )
+            self.assertFalse(Notification.objects.exists())
+
+        events.notification_buffer.flush()
+        self.assertEqual(Notification.objects.get().actor_count, 3)
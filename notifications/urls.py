@@ -0,0 +1,11 @@
+from rest_framework import routers
+
+from .views import NotificationViewSet
+
+# A SimpleRouter: the API root view of a DefaultRouter would shadow the list.
+router = routers.SimpleRouter()
+router.register(r"", NotificationViewSet, basename="notification")
+
+urlpatterns = router.urls
+
+app_name = "notifications"
@@ -0,0 +1,39 @@
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from social_media.metrics import SerializerTimingMixin
+from social_media.pagination import KeysetPagination
+from user.authentication import StatelessJWTAuthentication
+from . import events
+from .models import Notification
+from .serializers import MarkReadSerializer, NotificationSerializer
+
+
+class UpdatedAtKeysetPagination(KeysetPagination):
+    ordering = ("-updated_at", "-id")
+
+
+class NotificationViewSet(SerializerTimingMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """The requesting user's notifications, most recently active first."""
+    serializer_class = NotificationSerializer
+    pagination_class = UpdatedAtKeysetPagination
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Notification.objects.filter(recipient_id=self.request.user.pk).select_related("last_actor")
+
+    @action(methods=["GET"], detail=False, url_path="unread-count")
+    def unread_count(self, request):
+        """Served from a cached counter."""
+        return Response({"unread": events.unread_count(request.user.pk)})
+
+    @action(methods=["POST"], detail=False)
+    def read(self, request):
+        """Mark the notifications in ``ids`` read, or all of them without ``ids``."""
+        serializer = MarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changed = events.mark_read(request.user.pk, serializer.validated_data.get("ids"))
+        return Response({"read": changed})
@@ -0,0 +1,56 @@
+"""Batched hashtag resolution for post writes.
+
+Tag names are normalized to lower case without the leading ``#``. A post's
+tags are resolved with one ``INSERT ... ON CONFLICT DO NOTHING`` plus one
+``IN`` lookup and attached with one bulk insert into the through table,
+however many tags the post has. Tags of new posts also count towards
+trending, see ``trending.record_usage``. ``bulk_create`` sends no
+``post_save``, so resolved tags are announced through ``hashtags_resolved``.
+"""
+import re
+
+from django.dispatch import Signal
+
+from social_media.response_cache import response_cache
+from social_media.tasks import enqueue
+from .models import Hashtag, Post
+from .trending import record_usage
+
+HASHTAG_PATTERN = re.compile(r"(?<!\w)#(\w{1,60})")
+
+PostHashtag = Post.hashtags.through
+
+# Sent with ``hashtags``, ``{pk: name}``, for every batch of resolved tags.
+hashtags_resolved = Signal()
+
+
+def normalize_hashtag(name):
+    return name.strip().lstrip("#").lower()
+
+
+def extract_hashtags(content):
+    return HASHTAG_PATTERN.findall(content or "")
+
+
+def resolve_hashtags(names):
+    """Return the ids of the hashtags called ``names``, creating missing ones."""
+    names = {normalize_hashtag(name) for name in names} - {""}
+    if not names:
+        return []
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+    hashtags = dict(Hashtag.objects.filter(name__in=names).values_list("pk", "name"))
+    hashtags_resolved.send(sender=Hashtag, hashtags=hashtags)
+    return list(hashtags)
+
+
+def attach_hashtags(post, names, created=False):
+    hashtag_ids = resolve_hashtags(names)
+    if not hashtag_ids:
+        return
+    PostHashtag.objects.bulk_create(
+        [PostHashtag(post_id=post.pk, hashtag_id=hashtag_id) for hashtag_id in hashtag_ids],
+        ignore_conflicts=True,
+    )
+    response_cache.bump(f"post:{post.pk}", *(f"hashtag:{pk}" for pk in hashtag_ids))
+    if created:
+        enqueue(record_usage, hashtag_ids, post.created_at)
@@ -0,0 +1,31 @@
+"""Attaching uploaded images to posts.
+
+All files of one request are staged first and inserted with a single bulk
+insert; each one that still needs renditions is then queued for background
+processing (see ``social_media/images.py``).
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from social_media.images import queue_processing, stage_upload
+from social_media.response_cache import response_cache
+from .models import Post, PostImage
+
+
+def add_images(post, uploads):
+    """Append ``uploads`` to ``post`` after its existing images."""
+    with transaction.atomic():
+        # Serializes concurrent uploads to the same post on its row lock.
+        Post.objects.select_for_update().only("pk").get(pk=post.pk)
+        last = post.images.aggregate(last=Max("position"))["last"]
+        start = 0 if last is None else last + 1
+
+        images = [PostImage(post=post, position=start + offset) for offset in range(len(uploads))]
+        digests = [stage_upload(image, "image", upload) for image, upload in zip(images, uploads)]
+        PostImage.objects.bulk_create(images)
+
+        for image, digest in zip(images, digests):
+            if digest:
+                queue_processing(image, "image", digest, version=f"post:{post.pk}")
+        response_cache.bump(f"post:{post.pk}")
+    return images
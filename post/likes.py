@@ -0,0 +1,171 @@
+"""Like state and the denormalized ``Post.like_count`` counter.
+
+``like_post``/``unlike_post`` are a single conditional INSERT or DELETE on
+the likes table; the counter only moves when a row actually changed, so
+retries and double clicks are idempotent. ``like_posts``/``unlike_posts`` do
+the same for many posts with one multi-row statement. With ``LIKE_COUNTER_BUFFERED``
+counter deltas are collected in memory and written in batches, at most
+``LIKE_COUNTER_FLUSH_INTERVAL`` seconds after the first one, so a hot post
+does not serialize every liker on its row lock. Every new like is
+announced through ``post_liked``.
+"""
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, OuterRef, Value, When
+from django.dispatch import Signal
+from django.utils import timezone
+
+from social_media.db import SubqueryCount
+from social_media.response_cache import response_cache
+from social_media.tasks import enqueue, enqueue_later
+from .models import Like, Post
+
+# Sent with ``post_id`` and ``user_id`` whenever a like is added.
+post_liked = Signal()
+
+
+class LikeCounterBuffer:
+    def __init__(self):
+        self._deltas = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, post_id, delta):
+        with self._lock:
+            first = not self._deltas
+            self._deltas[post_id] += delta
+            size = len(self._deltas)
+        if size == settings.LIKE_COUNTER_FLUSH_SIZE:
+            enqueue(self.flush)
+        elif first:
+            enqueue_later(settings.LIKE_COUNTER_FLUSH_INTERVAL, self.flush)
+
+    def flush(self):
+        with self._lock:
+            deltas = {post_id: delta for post_id, delta in self._deltas.items() if delta}
+            self._deltas.clear()
+        apply_like_deltas(deltas)
+
+
+like_counter_buffer = LikeCounterBuffer()
+atexit.register(like_counter_buffer.flush)
+
+
+def apply_like_deltas(deltas):
+    """Apply ``{post_id: delta}`` to ``like_count`` in one UPDATE."""
+    if not deltas:
+        return
+    Post.objects.filter(pk__in=deltas).update(
+        like_count=F("like_count") + Case(
+            *(When(pk=post_id, then=Value(delta)) for post_id, delta in deltas.items()),
+            default=Value(0),
+        )
+    )
+    response_cache.bump(*(f"post:{post_id}" for post_id in deltas))
+
+
+def _buffer_like_deltas(deltas):
+    """Hand ``deltas`` to the buffer once the likes are committed.
+
+    The buffer outlives transactions, so a delta added before the commit
+    would be flushed even if its like row were rolled back.
+    """
+    def add():
+        for post_id, delta in deltas.items():
+            like_counter_buffer.add(post_id, delta)
+    transaction.on_commit(add)
+
+
+def _change_like_count(post_id, delta):
+    if settings.LIKE_COUNTER_BUFFERED:
+        _buffer_like_deltas({post_id: delta})
+        return
+    Post.objects.filter(pk=post_id).update(like_count=F("like_count") + delta)
+    response_cache.bump(f"post:{post_id}")
+
+
+def _change_like_counts(deltas):
+    if settings.LIKE_COUNTER_BUFFERED:
+        _buffer_like_deltas(deltas)
+        return
+    apply_like_deltas(deltas)
+
+
+def like_post(post_id, user_id):
+    """Like a post; returns ``False`` if it was already liked."""
+    table = connection.ops.quote_name(Like._meta.db_table)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (post_id, user_id, created_at) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+                [post_id, user_id, timezone.now()],
+            )
+            created = cursor.rowcount == 1
+        if created:
+            _change_like_count(post_id, 1)
+    if created:
+        post_liked.send(sender=Like, post_id=post_id, user_id=user_id)
+    return created
+
+
+def unlike_post(post_id, user_id):
+    """Remove a like; returns ``False`` if the post was not liked."""
+    with transaction.atomic():
+        deleted, _ = Like.objects.filter(post_id=post_id, user_id=user_id).delete()
+        if deleted:
+            _change_like_count(post_id, -1)
+    return bool(deleted)
+
+
+def like_posts(post_ids, user_id):
+    """Like each of ``post_ids``; returns the ids that were not liked yet."""
+    if not post_ids:
+        return set()
+    table = connection.ops.quote_name(Like._meta.db_table)
+    now = timezone.now()
+    values = ", ".join(["(%s, %s, %s)"] * len(post_ids))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (post_id, user_id, created_at) VALUES {values} "
+                f"ON CONFLICT DO NOTHING RETURNING post_id",
+                [value for post_id in sorted(post_ids) for value in (post_id, user_id, now)],
+            )
+            created = {post_id for post_id, in cursor.fetchall()}
+        _change_like_counts(dict.fromkeys(created, 1))
+    for post_id in sorted(created):
+        post_liked.send(sender=Like, post_id=post_id, user_id=user_id)
+    return created
+
+
+def unlike_posts(post_ids, user_id):
+    """Remove the likes on ``post_ids``; returns the ids that were liked."""
+    if not post_ids:
+        return set()
+    table = connection.ops.quote_name(Like._meta.db_table)
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE user_id = %s AND post_id = ANY(%s) RETURNING post_id",
+                [user_id, sorted(post_ids)],
+            )
+            deleted = {post_id for post_id, in cursor.fetchall()}
+        _change_like_counts(dict.fromkeys(deleted, -1))
+    return deleted
+
+
+def toggle_like(post_id, user_id):
+    """Unlike if liked, like otherwise; returns the new state."""
+    if unlike_post(post_id, user_id):
+        return False
+    return like_post(post_id, user_id)
+
+
+def refresh_like_counts(post_ids):
+    """Recount ``like_count`` for likes written through the ORM m2m manager."""
+    Post.objects.filter(pk__in=post_ids).update(
+        like_count=SubqueryCount(Like.objects.filter(post=OuterRef("pk")))
+    )
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from post.timeline import backfill_all_timelines
+
+
+class Command(BaseCommand):
+    help = "Fill the home timelines from the posts of each user and the accounts they follow."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Backfilled {backfill_all_timelines()} timelines")
@@ -0,0 +1,261 @@
+"""Benchmark the API in process against the current database.
+
+Each endpoint gets ``--requests`` requests from ``--concurrency`` threads
+through Django's test client, signed in as a sample of users with real
+access tokens. Latency percentiles, queries per request and throughput are
+printed as JSON; ``--compare`` adds the change against an earlier run.
+
+    python manage.py seed_social_graph --scale 10
+    python manage.py benchmark_api --output before.json
+    ... change something ...
+    python manage.py benchmark_api --compare before.json
+
+Queries are counted on every connection, including the threads the async
+views run their prefetches on. The like and follow endpoints toggle rows
+and run after the reads; ``--read-only`` skips them, and reseeding gives the
+next run the same data.
+"""
+import itertools
+import json
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from post.models import Comment, Hashtag, Like, Post, TimelineEntry
+from user.authentication import RefreshToken
+from user.models import Follow
+
+
+def _pick(items, i):
+    return items[i % len(items)]
+
+
+# name -> (writes, function of (virtual user, request number) -> (method, path, params))
+ENDPOINTS = {
+    "feed": (False, lambda user, i: ("get", reverse("post:post-list"), {})),
+    "feed_by_hashtag": (False, lambda user, i: (
+        "get", reverse("post:post-list"), {"hashtags": _pick(user["hashtags"], i)},
+    )),
+    "post_detail": (False, lambda user, i: (
+        "get", reverse("post:post-detail", args=[_pick(user["posts"], i)]), {},
+    )),
+    "post_comments": (False, lambda user, i: (
+        "get", reverse("post:comment-list"), {"post_id": _pick(user["posts"], i)},
+    )),
+    "user_followers": (False, lambda user, i: (
+        "get", reverse("user:user-followers", args=[_pick(user["followees"], i)]), {},
+    )),
+    "user_posts": (False, lambda user, i: (
+        "get", reverse("user:user-posts", args=[_pick(user["followees"], i)]), {},
+    )),
+    "like": (True, lambda user, i: (
+        "post", reverse("post:post-like", args=[_pick(user["posts"], i)]), {},
+    )),
+    "follow": (True, lambda user, i: (
+        "post", reverse("user:user-follow-unfollow", args=[_pick(user["followees"], i)]), {},
+    )),
+}
+
+
+class QueryCounter:
+    """Counts queries on every connection opened while it is installed."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._connections = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        with self._lock:
+            if connection not in self._connections:
+                self._connections.add(connection)
+                connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self.install)
+        for connection in connections.all():
+            self.install(connection=connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for connection in self._connections:
+            connection.execute_wrappers.remove(self)
+
+
+def percentile(values, rank):
+    """Nearest-rank ``rank``-th percentile of sorted ``values``."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+def _change(before, after):
+    if not before or after is None:
+        return ""
+    return f"{(after - before) / before * 100:+.0f}%"
+
+
+class Command(BaseCommand):
+    help = "Report latency, queries per request and throughput of the main API endpoints as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--users", type=int, default=50, help="Signed-in users to spread requests over.")
+        parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument("--read-only", action="store_true", help="Skip endpoints that write.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument("--compare", help="Earlier JSON report to compare with.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        users = self.virtual_users(options["users"], random.Random(options["seed"]))
+        if not users:
+            raise CommandError("No user follows anyone yet; run seed_social_graph first.")
+
+        endpoints = [
+            name for name in ENDPOINTS
+            if name in options["endpoints"] and not (options["read_only"] and ENDPOINTS[name][0])
+        ]
+        # Throttles would turn most of the run into 429s.
+        rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}
+        with override_settings(ALLOWED_HOSTS=["testserver"], REST_FRAMEWORK=rest_framework), \
+                QueryCounter() as queries:
+            results = {
+                name: self.run_endpoint(
+                    ENDPOINTS[name][1], users, options["requests"], options["concurrency"], queries
+                )
+                for name in endpoints
+            }
+
+        report = {
+            "finished_at": timezone.now().isoformat(),
+            "database": {
+                "users": get_user_model().objects.count(),
+                "follows": Follow.objects.count(),
+                "posts": Post.objects.count(),
+                "likes": Like.objects.count(),
+                "comments": Comment.objects.count(),
+                "hashtags": Hashtag.objects.count(),
+                "timeline_entries": TimelineEntry.objects.count(),
+            },
+            "options": {key: options[key] for key in ("requests", "concurrency", "users")},
+            "endpoints": results,
+        }
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                self.compare(json.load(file), report)
+
+    def virtual_users(self, count, rng):
+        """Users with followees and a non-empty timeline, and what they request."""
+        candidates = list(
+            Follow.objects.order_by().values_list("follower_id", flat=True).distinct()
+        )
+        users = []
+        for pk in rng.sample(candidates, min(len(candidates), count * 2)):
+            posts = list(
+                TimelineEntry.objects.filter(owner_id=pk)
+                .order_by("-created_at")
+                .values_list("post_id", flat=True)[:20]
+            )
+            if not posts:
+                continue
+            followees = list(Follow.objects.filter(follower_id=pk).values_list("followee_id", flat=True)[:50])
+            hashtags = list(
+                Hashtag.objects.filter(posts__in=posts).order_by().values_list("name", flat=True).distinct()[:10]
+            )
+            access = RefreshToken.for_user(get_user_model().objects.get(pk=pk)).access_token
+            users.append({
+                "authorization": f"Bearer {access}",
+                "posts": posts,
+                "followees": followees,
+                "hashtags": hashtags or ["topic0"],
+            })
+            if len(users) == count:
+                break
+        return users
+
+    def run_endpoint(self, endpoint, users, total, concurrency, queries):
+        latencies, errors = [], []
+        counter = itertools.count()
+
+        def worker():
+            client = Client()
+            try:
+                while (i := next(counter)) < total:
+                    user = _pick(users, i)
+                    method, path, params = endpoint(user, i)
+                    started = time.perf_counter()
+                    response = getattr(client, method)(path, params, HTTP_AUTHORIZATION=user["authorization"])
+                    elapsed = time.perf_counter() - started
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+                    else:
+                        latencies.append(elapsed * 1000)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        queries_before = queries.count
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": total,
+            "errors": len(errors),
+            "error_statuses": sorted(set(errors)),
+            "throughput_rps": round(len(latencies) / duration, 1),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+            },
+            "queries_per_request": round((queries.count - queries_before) / total, 2),
+        }
+
+    def compare(self, before, after):
+        self.stdout.write(
+            f"\n{'endpoint':<18} {'p50 ms':>14} {'p95 ms':>14} {'p99 ms':>14} {'queries':>12} {'req/s':>14}"
+        )
+        for name, result in after["endpoints"].items():
+            previous = before["endpoints"].get(name)
+            if previous is None:
+                continue
+            cells = [
+                (previous["latency_ms"][key], result["latency_ms"][key]) for key in ("p50", "p95", "p99")
+            ] + [
+                (previous["queries_per_request"], result["queries_per_request"]),
+                (previous["throughput_rps"], result["throughput_rps"]),
+            ]
+            widths = (14, 14, 14, 12, 14)
+            self.stdout.write(f"{name:<18} " + " ".join(
+                f"{(f'{new:.1f} ' if new is not None else '') + _change(old, new):>{width}}"
+                for (old, new), width in zip(cells, widths)
+            ))
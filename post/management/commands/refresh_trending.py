@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from post.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = "Recompute the trending hashtags snapshot and prune expired usage counters."
+
+    def handle(self, *args, **options):
+        snapshot = refresh_trending()
+        self.stdout.write(f"{len(snapshot['results'])} trending hashtags at {snapshot['computed_at']}")
@@ -0,0 +1,307 @@
+"""Generate a synthetic social graph for load tests.
+
+Followers and posting activity follow a power law: a few accounts have most
+of the followers and write most of the posts, like on a real network. Rows
+are streamed to PostgreSQL with ``COPY`` (plain ``executemany`` elsewhere)
+and home timelines are materialized with one ``INSERT ... SELECT``, so a
+million posts take minutes, not hours.
+
+    python manage.py seed_social_graph --scale 10
+"""
+import io
+import itertools
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, OuterRef
+from django.utils import timezone
+
+from post.models import Comment, Hashtag, HashtagUsage, Like, Post, TimelineEntry
+from post.trending import bucket_start
+from social_media.db import SubqueryCount
+from user.models import Follow
+
+CHUNK_SIZE = 50_000
+
+User = get_user_model()
+PostHashtag = Post.hashtags.through
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return (
+        str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    )
+
+
+def _prep_value(field, value):
+    # Ids and timestamps need no conversion; skipping it matters at millions of rows.
+    if isinstance(value, (int, datetime)):
+        return value
+    return field.get_prep_value(value)
+
+
+def insert_rows(model, rows, with_pk=True):
+    """Write ``rows``, dicts keyed by attname, into ``model``'s table.
+
+    Fields missing from a row get their default. Signals, ``save()`` and
+    ``auto_now_add`` are bypassed.
+    """
+    fields = [field for field in model._meta.concrete_fields if with_pk or not field.primary_key]
+    defaults = {field.attname: field.get_default() for field in fields}
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    rows = iter(rows)
+    count = 0
+    with connection.cursor() as cursor:
+        while chunk := list(itertools.islice(rows, CHUNK_SIZE)):
+            count += len(chunk)
+            if connection.vendor == "postgresql":
+                buffer = io.StringIO()
+                for row in chunk:
+                    buffer.write("\t".join(
+                        _copy_value(_prep_value(field, row.get(field.attname, defaults[field.attname])))
+                        for field in fields
+                    ) + "\n")
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+            else:
+                placeholders = ", ".join(["%s"] * len(fields))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                    [
+                        [field.get_db_prep_save(row.get(field.attname, defaults[field.attname]), connection)
+                         for field in fields]
+                        for row in chunk
+                    ],
+                )
+    return count
+
+
+def next_pk(model):
+    return (model.objects.aggregate(pk=Max("pk"))["pk"] or 0) + 1
+
+
+class PowerLaw:
+    """Draws from ``population`` with weight ``1 / rank ** exponent``."""
+
+    def __init__(self, rng, population, exponent):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.population) + 1)
+        ))
+
+    def sample(self, count):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=count)
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate users, follows, posts, hashtags, likes, comments and timelines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0,
+                            help="Multiplies --users, --posts and --hashtags.")
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--posts", type=int, default=100_000)
+        parser.add_argument("--hashtags", type=int, default=1_000)
+        parser.add_argument("--follows-per-user", type=float, default=30,
+                            help="Mean out-degree; the in-degree follows a power law.")
+        parser.add_argument("--likes-per-post", type=float, default=5)
+        parser.add_argument("--comments-per-post", type=float, default=2)
+        parser.add_argument("--reply-ratio", type=float, default=0.3,
+                            help="Share of comments that reply to an earlier comment of the same post.")
+        parser.add_argument("--exponent", type=float, default=1.0,
+                            help="Power-law exponent of follower counts and posting activity.")
+        parser.add_argument("--days", type=int, default=30, help="Posts are spread over this many days.")
+        parser.add_argument("--password", default="password", help="Password of every generated user.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.options = options
+        scale = options["scale"]
+        with transaction.atomic():
+            user_ids = self.create_users(max(2, int(options["users"] * scale)))
+            self.create_follows(user_ids)
+            hashtag_ids = self.create_hashtags(max(1, int(options["hashtags"] * scale)))
+            post_ids = self.create_posts(user_ids, hashtag_ids, max(1, int(options["posts"] * scale)))
+            self.create_likes(user_ids, post_ids)
+            self.create_comments(user_ids, post_ids)
+            self.create_timelines(post_ids)
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [User, Post, Comment]):
+                    cursor.execute(sql)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def report(self, name, count):
+        self.stdout.write(f"{name}: {count}")
+
+    def create_users(self, count):
+        first = next_pk(User)
+        password = make_password(self.options["password"])
+        ids = range(first, first + count)
+        self.report("users", insert_rows(User, (
+            {
+                "id": pk,
+                "email": f"user{pk}@example.com",
+                "first_name": f"First{pk}",
+                "last_name": f"Last{pk}",
+                "password": password,
+                "date_joined": self.now,
+            }
+            for pk in ids
+        )))
+        return ids
+
+    def out_degree(self, mean, limit):
+        """Heavy-tailed count with the given mean (Pareto with alpha 2 has mean 2)."""
+        return min(limit, int(mean * self.rng.paretovariate(2) / 2 + self.rng.random()))
+
+    def create_follows(self, user_ids):
+        popular = PowerLaw(self.rng, user_ids, self.options["exponent"])
+
+        def rows():
+            for follower_id in user_ids:
+                degree = self.out_degree(self.options["follows_per_user"], len(user_ids) - 1)
+                for followee_id in set(popular.sample(degree)) - {follower_id}:
+                    yield {"follower_id": follower_id, "followee_id": followee_id, "created_at": self.now}
+
+        self.report("follows", insert_rows(Follow, rows(), with_pk=False))
+
+    def create_hashtags(self, count):
+        names = [f"topic{i}" for i in range(count)]
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+        self.report("hashtags", count)
+        return dict(Hashtag.objects.filter(name__in=names).values_list("pk", "name"))
+
+    def create_posts(self, user_ids, hashtags, count):
+        first = next_pk(Post)
+        ids = range(first, first + count)
+        active = PowerLaw(self.rng, user_ids, self.options["exponent"])
+        trending = PowerLaw(self.rng, hashtags, self.options["exponent"])
+        authors = active.sample(count)
+        tags = [set(trending.sample(self.rng.randint(0, 3))) for _ in ids]
+        period = timedelta(days=self.options["days"]).total_seconds()
+        self.created_at = [self.now - timedelta(seconds=self.rng.uniform(0, period)) for _ in ids]
+
+        self.report("posts", insert_rows(Post, (
+            {
+                "id": pk,
+                "author_id": author_id,
+                "content": " ".join([f"Post {pk}"] + [f"#{hashtags[tag]}" for tag in post_tags]),
+                "created_at": created_at,
+            }
+            for pk, author_id, post_tags, created_at in zip(ids, authors, tags, self.created_at)
+        )))
+        insert_rows(PostHashtag, (
+            {"post_id": pk, "hashtag_id": hashtag_id} for pk, post_tags in zip(ids, tags) for hashtag_id in post_tags
+        ), with_pk=False)
+        self.create_hashtag_usage(tags)
+        return ids
+
+    def create_hashtag_usage(self, tags):
+        usage = Counter(
+            (hashtag_id, bucket_start(created_at))
+            for post_tags, created_at in zip(tags, self.created_at)
+            for hashtag_id in post_tags
+        )
+        if not usage:
+            return
+        # Merge with counters of earlier runs instead of colliding with them.
+        existing = HashtagUsage.objects.filter(bucket__gte=min(bucket for _, bucket in usage))
+        for hashtag_id, bucket, count in existing.values_list("hashtag_id", "bucket", "count"):
+            usage[hashtag_id, bucket] += count
+        existing.delete()
+        insert_rows(HashtagUsage, (
+            {"hashtag_id": hashtag_id, "bucket": bucket, "count": count}
+            for (hashtag_id, bucket), count in usage.items()
+        ), with_pk=False)
+
+    def create_likes(self, user_ids, post_ids):
+        def rows():
+            for post_id, created_at in zip(post_ids, self.created_at):
+                degree = self.out_degree(self.options["likes_per_post"], len(user_ids))
+                age = (self.now - created_at).total_seconds()
+                for user_id in set(self.rng.choices(user_ids, k=degree)):
+                    yield {
+                        "post_id": post_id,
+                        "user_id": user_id,
+                        "created_at": created_at + timedelta(seconds=self.rng.uniform(0, age)),
+                    }
+
+        self.report("likes", insert_rows(Like, rows(), with_pk=False))
+        Post.objects.filter(pk__range=(post_ids[0], post_ids[-1])).update(
+            like_count=SubqueryCount(Like.objects.filter(post=OuterRef("pk")))
+        )
+
+    def create_comments(self, user_ids, post_ids):
+        first = next_pk(Comment)
+
+        def rows():
+            pk = first
+            for post_id, created_at in zip(post_ids, self.created_at):
+                thread = []
+                for _ in range(self.out_degree(self.options["comments_per_post"], len(user_ids))):
+                    row = {
+                        "id": pk,
+                        "post_id": post_id,
+                        "author_id": self.rng.choice(user_ids),
+                        "content": f"Comment {pk}",
+                        "created_at": created_at + timedelta(minutes=self.rng.randint(1, 600)),
+                    }
+                    if thread and self.rng.random() < self.options["reply_ratio"]:
+                        parent = self.rng.choice(thread)
+                        row.update(
+                            parent_id=parent["id"],
+                            root_id=parent.get("root_id") or parent["id"],
+                            depth=parent.get("depth", 0) + 1,
+                            created_at=parent["created_at"] + timedelta(minutes=self.rng.randint(1, 600)),
+                        )
+                    thread.append(row)
+                    yield row
+                    pk += 1
+
+        self.report("comments", insert_rows(Comment, rows()))
+        Comment.objects.filter(pk__gte=first).update(
+            reply_count=SubqueryCount(Comment.objects.filter(parent=OuterRef("pk")))
+        )
+
+    def create_timelines(self, post_ids):
+        """Fan each post out to its author and followers, as ``publish_post`` does,
+        except for authors above ``TIMELINE_FANOUT_LIMIT`` followers."""
+        quote = connection.ops.quote_name
+        entries, posts, follows = (
+            quote(model._meta.db_table) for model in (TimelineEntry, Post, Follow)
+        )
+        sql = f"""
+            INSERT INTO {entries} (owner_id, post_id, created_at)
+            SELECT p.author_id, p.id, p.created_at FROM {posts} p
+            WHERE p.id BETWEEN %s AND %s
+            UNION ALL
+            SELECT f.follower_id, p.id, p.created_at FROM {posts} p
+            JOIN {follows} f ON f.followee_id = p.author_id
+            WHERE p.id BETWEEN %s AND %s AND p.author_id NOT IN (
+                SELECT followee_id FROM {follows} GROUP BY followee_id HAVING COUNT(*) > %s
+            )
+        """
+        bounds = [post_ids[0], post_ids[-1]]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, bounds + bounds + [settings.TIMELINE_FANOUT_LIMIT])
+            self.report("timeline entries", cursor.rowcount)
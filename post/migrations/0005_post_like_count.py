@@ -0,0 +1,29 @@
+# Generated by Django 4.0.4 on 2026-10-18 04:28
+
+from django.db import migrations, models
+from django.db.models import OuterRef
+
+from social_media.db import SubqueryCount
+
+
+def count_existing_likes(apps, schema_editor):
+    Post = apps.get_model("post", "Post")
+    Post.objects.update(
+        like_count=SubqueryCount(Post.likes.through.objects.filter(post=OuterRef("pk")))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_likes, migrations.RunPython.noop),
+    ]
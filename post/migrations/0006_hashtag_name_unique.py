@@ -0,0 +1,40 @@
+# Generated by Django 4.0.4 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+def merge_duplicate_hashtags(apps, schema_editor):
+    """Lower-case hashtag names and fold case duplicates into one row."""
+    Hashtag = apps.get_model("post", "Hashtag")
+    PostHashtag = apps.get_model("post", "Post").hashtags.through
+    survivors = {}
+    for hashtag in Hashtag.objects.order_by("pk").iterator():
+        name = hashtag.name.strip().lstrip("#").lower()
+        if name in survivors:
+            post_ids = PostHashtag.objects.filter(hashtag_id=hashtag.pk).values_list("post_id", flat=True)
+            PostHashtag.objects.bulk_create(
+                [PostHashtag(post_id=post_id, hashtag_id=survivors[name]) for post_id in post_ids],
+                ignore_conflicts=True,
+            )
+            hashtag.delete()
+            continue
+        survivors[name] = hashtag.pk
+        if hashtag.name != name:
+            hashtag.name = name
+            hashtag.save(update_fields=["name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0005_post_like_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_hashtags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='hashtag',
+            name='name',
+            field=models.CharField(max_length=60, unique=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.4 on 2026-10-18 04:34
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0006_hashtag_name_unique'),
+        ('user', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hashtag',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='hashtag_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('content', config='english'), name='post_content_search_idx'),
+        ),
+    ]
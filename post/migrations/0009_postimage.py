@@ -0,0 +1,68 @@
+# Generated by Django 4.0.4 on 2026-10-18 04:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import post.models
+
+
+def move_post_images(apps, schema_editor):
+    Post = apps.get_model("post", "Post")
+    PostImage = apps.get_model("post", "PostImage")
+    posts = Post.objects.exclude(image="").exclude(image__isnull=True)
+    PostImage.objects.bulk_create(
+        (
+            PostImage(
+                post_id=post.pk,
+                position=0,
+                image=post.image.name,
+                image_status=post.image_status,
+                image_renditions=post.image_renditions,
+            )
+            for post in posts.only("pk", "image", "image_status", "image_renditions").iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveSmallIntegerField()),
+                ('image', models.ImageField(upload_to=post.models.post_image_file_path)),
+                ('image_status', models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], max_length=10)),
+                ('image_renditions', models.JSONField(blank=True, default=dict)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('placeholder', models.TextField(blank=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='post.post')),
+            ],
+            options={
+                'ordering': ('position',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postimage',
+            constraint=models.UniqueConstraint(fields=('post', 'position'), name='unique_post_image_position'),
+        ),
+        migrations.RunPython(move_post_images, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='post',
+            name='image',
+        ),
+        migrations.RemoveField(
+            model_name='post',
+            name='image_renditions',
+        ),
+        migrations.RemoveField(
+            model_name='post',
+            name='image_status',
+        ),
+    ]
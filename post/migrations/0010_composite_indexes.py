@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0009_postimage'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_owner_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-created_at'], include=('post',), name='timeline_owner_created_idx'),
+        ),
+        # The auto-created through tables only have (post_id, <other>_id)
+        # unique indexes; tag pages and liked-posts pages look up the other
+        # way round and can now answer from the index alone.
+        migrations.RunSQL(
+            'CREATE INDEX post_hashtags_hashtag_post_idx ON post_post_hashtags (hashtag_id, post_id)',
+            'DROP INDEX post_hashtags_hashtag_post_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX post_likes_user_post_idx ON post_post_likes (user_id, post_id)',
+            'DROP INDEX post_likes_user_post_idx',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.4 on 2026-10-18 05:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_hashtag_usage(apps, schema_editor):
+    """Count the posts of the last ``TRENDING_WINDOW_DAYS`` so trending starts warm."""
+    Post = apps.get_model("post", "Post")
+    HashtagUsage = apps.get_model("post", "HashtagUsage")
+    quote = schema_editor.quote_name
+    size = settings.TRENDING_BUCKET_SECONDS
+    schema_editor.execute(
+        f"INSERT INTO {quote(HashtagUsage._meta.db_table)} (hashtag_id, bucket, count) "
+        f"SELECT ph.hashtag_id, to_timestamp(floor(extract(epoch FROM p.created_at) / %s) * %s), COUNT(*) "
+        f"FROM {quote(Post.hashtags.through._meta.db_table)} ph "
+        f"JOIN {quote(Post._meta.db_table)} p ON p.id = ph.post_id "
+        f"WHERE p.created_at >= NOW() - %s * INTERVAL '1 day' GROUP BY 1, 2",
+        [size, size, settings.TRENDING_WINDOW_DAYS],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0011_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashtagUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField(db_index=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='post.hashtag')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='hashtagusage',
+            constraint=models.UniqueConstraint(fields=('hashtag', 'bucket'), name='unique_hashtag_usage_bucket'),
+        ),
+        migrations.RunPython(backfill_hashtag_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def backfill_timelines(apps, schema_editor):
+    """Timelines only get entries for new posts and follows; fill them for existing ones.
+
+    This runs the same code as a new follow, on the current models: it reads
+    only columns that existed when timelines were added, and a fresh
+    database has no users to fill.
+    """
+    from post.timeline import backfill_all_timelines
+
+    backfill_all_timelines()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0014_timeline_feed_index'),
+        ('user', '0008_follow_page_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
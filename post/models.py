@@ -1,43 +1,211 @@
 import os
-import uuid
+from operator import attrgetter
 
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
-from django.template.defaultfilters import slugify
-from user.models import User
+from django.db.models import Exists, OuterRef
+
+from social_media.db import SubqueryCount, TopPerGroup
+from social_media.images import ImageStatus
+from user.models import Follow, User
+
+
+class HashtagQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            posts_count=SubqueryCount(Post.hashtags.through.objects.filter(hashtag=OuterRef("pk"))),
+        )
 
 
 class Hashtag(models.Model):
-    name = models.CharField(max_length=60)
+    name = models.CharField(max_length=60, unique=True)
+
+    objects = HashtagQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="hashtag_name_trgm_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class HashtagUsage(models.Model):
+    """How many posts used a hashtag in the ``TRENDING_BUCKET_SECONDS`` starting at ``bucket``."""
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="usage", db_index=False)
+    bucket = models.DateTimeField(db_index=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["hashtag", "bucket"], name="unique_hashtag_usage_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.hashtag_id} @ {self.bucket:%Y-%m-%d %H:%M}: {self.count}"
+
+
 def post_image_file_path(instance, filename: str):
-    _, extension = os.path.splitext(filename)
-    filename = f"{slugify(instance.title)}-{uuid.uuid4()}{extension}"
+    """Staging path; processed renditions live in ``uploads/posts/<sha256>/``."""
+    return os.path.join("uploads", "posts", "incoming", filename)
 
-    return os.path.join("uploads", "posts", filename)
+
+class PostQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            comments_count=SubqueryCount(Comment.objects.filter(post=OuterRef("pk"))),
+        )
+
+    def with_viewer_state(self, user):
+        """Whether ``user`` has liked each post and follows its author."""
+        return self.annotate(
+            viewer_has_liked=Exists(Like.objects.filter(post=OuterRef("pk"), user_id=user.pk)),
+            viewer_follows_author=Exists(
+                Follow.objects.filter(follower_id=user.pk, followee=OuterRef("author_id"))
+            ),
+        )
+
+
+class CommentPreview:
+    """``post.comment_preview``: its latest ``COMMENT_PREVIEW_SIZE`` top-level comments.
+
+    ``Prefetch("comment_preview", to_attr="comment_preview")`` loads them for
+    a whole page of posts in one query, however many comments each has.
+    """
+    name = "comment_preview"
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        queryset = self.get_prefetch_queryset([instance])[0]
+        preview = instance.__dict__[self.name] = list(queryset)
+        return preview
+
+    def is_cached(self, instance):
+        return self.name in instance.__dict__
+
+    def get_prefetch_queryset(self, instances, queryset=None):
+        if queryset is None:
+            queryset = Comment.objects.select_related("author")
+        latest = TopPerGroup(
+            Comment.objects.filter(post__in=[instance.pk for instance in instances], depth=0),
+            partition_by="post",
+            order_by=("-created_at", "-id"),
+            limit=settings.COMMENT_PREVIEW_SIZE,
+        )
+        queryset = queryset.filter(pk__in=latest).order_by("-created_at", "-id")
+        return queryset, attrgetter("post_id"), attrgetter("pk"), False, self.name, False
 
 
 class Post(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="posts")
     content = models.TextField()
-    image = models.ImageField(upload_to=post_image_file_path, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    likes = models.ManyToManyField(User, related_name="likes", blank=True)
+    likes = models.ManyToManyField(User, through="Like", related_name="likes", blank=True)
+    like_count = models.PositiveIntegerField(default=0)
     hashtags = models.ManyToManyField(Hashtag, blank=True, related_name="posts")
 
+    objects = PostQuerySet.as_manager()
+    comment_preview = CommentPreview()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="post_created_id_idx"),
+            models.Index(fields=["author", "-created_at", "-id"], name="post_author_created_id_idx"),
+            GinIndex(SearchVector("content", config="english"), name="post_content_search_idx"),
+        ]
+
     def __str__(self):
         return f"{self.content}... author: {self.author}"
 
 
+class Like(models.Model):
+    """A user's like of a post; ``Post.likes`` reads and writes through it."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="like_edges", db_index=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="like_edges", db_index=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The table of the auto-created through model it replaces.
+        db_table = "post_post_likes"
+        unique_together = [("post", "user")]
+        indexes = [
+            # Liked posts, newest like first.
+            models.Index(fields=["user", "-created_at", "-id"], include=["post"], name="like_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} likes {self.post_id}"
+
+
+class PostImage(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="images")
+    position = models.PositiveSmallIntegerField()
+    image = models.ImageField(upload_to=post_image_file_path)
+    image_status = models.CharField(max_length=10, choices=ImageStatus.choices, blank=True)
+    image_renditions = models.JSONField(default=dict, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    placeholder = models.TextField(blank=True)
+
+    upload_folder = "posts"
+
+    class Meta:
+        ordering = ("position",)
+        constraints = [
+            models.UniqueConstraint(fields=["post", "position"], name="unique_post_image_position"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.image.name}"
+
+
 class Comment(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="comments")
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    # Replies point at the comment they answer and at the top-level comment
+    # of their thread; both are null for top-level comments.
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="replies", db_index=False
+    )
+    root = models.ForeignKey("self", on_delete=models.CASCADE, null=True, blank=True, related_name="descendants")
+    depth = models.PositiveSmallIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "depth", "-created_at", "-id"], name="comment_post_depth_created_idx"),
+            models.Index(fields=["parent", "created_at", "id"], name="comment_parent_created_idx"),
+        ]
 
     def __str__(self):
         return f"{self.author}: {self.content[:15]}"
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.parent_id is not None:
+            self.root_id = self.parent.root_id or self.parent_id
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline_entries")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="timeline_entries")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "post"], name="unique_timeline_entry"),
+        ]
+        indexes = [
+            # Feed pages seek on (created_at, post) within one owner.
+            models.Index(fields=["owner", "-created_at", "-post"], name="timeline_owner_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner}: {self.post_id}"
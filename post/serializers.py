@@ -1,15 +1,28 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Hashtag, Post, Comment
+from rest_framework.validators import UniqueValidator
+
+from social_media.images import RenditionsField
+from .hashtags import attach_hashtags, extract_hashtags, normalize_hashtag
+from .models import Hashtag, Post, PostImage, Comment
 from user.serializers import UserSerializer
 
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField()
+    replies = serializers.IntegerField(source="reply_count", read_only=True)
 
     class Meta:
         model = Comment
-        fields = ("id", "author", "content", "created_at")
-        read_only_fields = ("created_at",)
+        fields = ("id", "author", "content", "parent", "depth", "replies", "created_at")
+        read_only_fields = ("depth", "created_at")
+
+    def get_extra_kwargs(self):
+        extra_kwargs = super().get_extra_kwargs()
+        if self.instance is not None:
+            # Replies cannot move: root, depth and reply counts follow the parent set on create.
+            extra_kwargs["parent"] = {"read_only": True}
+        return extra_kwargs
 
 
 class HashtagField(serializers.CharField):
@@ -18,13 +31,27 @@ class HashtagField(serializers.CharField):
             return f"#{value}"
         return None
 
+    default_error_messages = {"empty": "A hashtag needs a name after the #."}
+
     def to_internal_value(self, data):
-        hashtag_value = data.lstrip("#")
-        return super().to_internal_value(hashtag_value)
+        name = normalize_hashtag(super().to_internal_value(data))
+        if not name:
+            self.fail("empty")
+        return name
 
 
 class HashtagSerializer(serializers.ModelSerializer):
-    name = HashtagField(required=False)
+    # Validators run on the normalized name, so "#Tag" and "tag" collide.
+    name = HashtagField(max_length=60, validators=[UniqueValidator(queryset=Hashtag.objects.all())])
+
+    class Meta:
+        model = Hashtag
+        fields = ("id", "name")
+
+
+class PostHashtagSerializer(serializers.ModelSerializer):
+    """A tag of a post payload, by name; existing tags are reused."""
+    name = HashtagField(max_length=60)
 
     class Meta:
         model = Hashtag
@@ -32,7 +59,7 @@ class HashtagSerializer(serializers.ModelSerializer):
 
 
 class HashtagListSerializer(HashtagSerializer):
-    posts = serializers.IntegerField(source="posts.count", read_only=True)
+    posts = serializers.IntegerField(source="posts_count", read_only=True)
 
     class Meta:
         model = Hashtag
@@ -40,16 +67,37 @@ class HashtagListSerializer(HashtagSerializer):
 
 
 class PostImageSerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source="image_status", read_only=True)
+    renditions = RenditionsField(source="image_renditions")
+
     class Meta:
-        model = Post
-        fields = ("id", "image")
+        model = PostImage
+        fields = ("id", "position", "image", "status", "renditions", "width", "height", "placeholder")
+        read_only_fields = fields
+
+
+class PostImageUploadSerializer(serializers.Serializer):
+    images = serializers.ListField(
+        child=serializers.ImageField(),
+        allow_empty=False,
+        max_length=settings.POST_MAX_IMAGES_PER_UPLOAD,
+    )
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    posts = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_IDS,
+    )
+    liked = serializers.BooleanField(default=True)
 
 
 class PostSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S")
-    hashtags = HashtagSerializer(many=True, read_only=True)
+    hashtags = PostHashtagSerializer(many=True, required=False)
     images = PostImageSerializer(many=True, read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = CommentSerializer(source="comment_preview", many=True, read_only=True)
 
     class Meta:
         model = Post
@@ -63,33 +111,36 @@ class PostSerializer(serializers.ModelSerializer):
                   )
 
     def create(self, validated_data):
-        hashtags = validated_data.pop("hashtags", None)
+        hashtags = validated_data.pop("hashtags", [])
         post = Post.objects.create(**validated_data)
-
-        if hashtags:
-            for hashtag in hashtags:
-                hashtag_name, _ = Hashtag.objects.get_or_create(name=hashtag["name"])
-                post.hashtags.add(hashtag_name)
-
+        attach_hashtags(
+            post, [hashtag["name"] for hashtag in hashtags] + extract_hashtags(post.content), created=True
+        )
         return post
 
     def update(self, instance, validated_data):
-        hashtags = validated_data.pop("hashtags", None)
+        hashtags = validated_data.pop("hashtags", [])
         instance = super().update(instance, validated_data)
+        names = [hashtag["name"] for hashtag in hashtags]
+        if "content" in validated_data:
+            names += extract_hashtags(instance.content)
+        attach_hashtags(instance, names)
+        return instance
 
-        if hashtags:
-            for hashtag in hashtags:
-                hashtag_name, _ = Hashtag.objects.get_or_create(name=hashtag["name"])
-                instance.hashtags.add(hashtag_name)
 
-        return instance
+class ViewerStateFields(serializers.Serializer):
+    """Per-viewer flags from ``PostQuerySet.with_viewer_state``; ``null`` where
+    the posts were loaded without it, as in shared cached payloads."""
+    viewer_has_liked = serializers.BooleanField(read_only=True, allow_null=True)
+    viewer_follows_author = serializers.BooleanField(read_only=True, allow_null=True)
 
 
-class PostListSerializer(PostSerializer):
+class PostListSerializer(ViewerStateFields, PostSerializer):
     author = serializers.SlugRelatedField(slug_field="email", read_only=True)
     hashtags = serializers.SlugRelatedField(slug_field="name", read_only=True, many=True)
-    likes = serializers.IntegerField(read_only=True, source="likes.count")
-    comments = serializers.IntegerField(read_only=True, source="comments.count")
+    likes = serializers.IntegerField(read_only=True, source="like_count")
+    comments = serializers.IntegerField(read_only=True, source="comments_count")
+    latest_comments = CommentSerializer(source="comment_preview", many=True, read_only=True)
 
     class Meta:
         model = Post
@@ -97,15 +148,18 @@ class PostListSerializer(PostSerializer):
                   "author",
                   "likes",
                   "comments",
+                  "latest_comments",
                   "hashtags",
-                  "images")
+                  "images",
+                  "viewer_has_liked",
+                  "viewer_follows_author")
 
 
-class PostDetailSerializer(PostSerializer):
+class PostDetailSerializer(ViewerStateFields, PostSerializer):
     author = UserSerializer(read_only=True)
-    hashtags = HashtagSerializer(read_only=True)
-    comments = CommentSerializer(read_only=True)
-    likes = serializers.IntegerField(source="likes.count", read_only=True)
+    hashtags = HashtagSerializer(many=True, read_only=True)
+    likes = serializers.IntegerField(source="like_count", read_only=True)
+    comments_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Post
@@ -115,7 +169,11 @@ class PostDetailSerializer(PostSerializer):
                   "images",
                   "likes",
                   "comments",
-                  "created_at")
+                  "comments_count",
+                  "hashtags",
+                  "created_at",
+                  "viewer_has_liked",
+                  "viewer_follows_author")
 
 
 class HashtagDetailSerializer(HashtagSerializer):
@@ -0,0 +1,105 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from social_media.response_cache import response_cache
+from user.follows import follow_created, follow_removed, follows_created, follows_removed
+from . import likes, timeline
+from .models import Comment, Hashtag, Like, Post
+
+
+@receiver(post_save, sender=Post)
+def publish_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.publish_post(instance)
+
+
+@receiver(follow_created)
+def backfill_followed_posts(sender, follower_id, followee_id, **kwargs):
+    timeline.backfill_timeline(follower_id, [followee_id])
+
+
+@receiver(follows_created)
+def backfill_batch_followed_posts(sender, follower_id, followee_ids, **kwargs):
+    timeline.backfill_timeline(follower_id, followee_ids)
+
+
+@receiver(follow_removed)
+def prune_unfollowed_posts(sender, follower_id, followee_id, **kwargs):
+    timeline.remove_from_timeline(follower_id, [followee_id])
+
+
+@receiver(follows_removed)
+def prune_batch_unfollowed_posts(sender, follower_id, followee_ids, **kwargs):
+    timeline.remove_from_timeline(follower_id, followee_ids)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    response_cache.bump(f"post:{instance.pk}")
+
+
+@receiver(pre_delete, sender=Post)
+def invalidate_post_hashtags(sender, instance, **kwargs):
+    hashtag_ids = instance.hashtags.values_list("pk", flat=True)
+    response_cache.bump(*(f"hashtag:{pk}" for pk in hashtag_ids))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    response_cache.bump(f"post:{instance.post_id}")
+
+
+@receiver(post_save, sender=Comment)
+def count_new_reply(sender, instance, created, **kwargs):
+    if created and instance.parent_id is not None:
+        Comment.objects.filter(pk=instance.parent_id).update(reply_count=F("reply_count") + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_reply(sender, instance, **kwargs):
+    if instance.parent_id is not None:
+        Comment.objects.filter(pk=instance.parent_id).update(reply_count=F("reply_count") - 1)
+
+
+@receiver(post_save, sender=Hashtag)
+def invalidate_hashtag(sender, instance, **kwargs):
+    response_cache.bump(f"hashtag:{instance.pk}")
+
+
+@receiver(m2m_changed, sender=Post.hashtags.through)
+def invalidate_post_hashtag_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        related = instance.posts if reverse else instance.hashtags
+        pk_set = set(related.values_list("pk", flat=True))
+    elif action not in ("post_add", "post_remove"):
+        return
+
+    if reverse:
+        post_ids, hashtag_ids = pk_set, [instance.pk]
+    else:
+        post_ids, hashtag_ids = [instance.pk], pk_set
+    response_cache.bump(
+        *(f"post:{pk}" for pk in post_ids),
+        *(f"hashtag:{pk}" for pk in hashtag_ids),
+    )
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def sync_like_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._cleared_like_post_ids = list(instance.likes.values_list("pk", flat=True))
+    if action == "post_clear":
+        post_ids = getattr(instance, "_cleared_like_post_ids", []) if reverse else [instance.pk]
+    elif action in ("post_add", "post_remove"):
+        post_ids = pk_set if reverse else [instance.pk]
+    else:
+        return
+    likes.refresh_like_counts(post_ids)
+    response_cache.bump(*(f"post:{pk}" for pk in post_ids))
+    if action == "post_add":
+        for pk in pk_set:
+            post_id, user_id = (pk, instance.pk) if reverse else (instance.pk, pk)
+            likes.post_liked.send(sender=Like, post_id=post_id, user_id=user_id)
@@ -1,12 +1,45 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APIClient, APIRequestFactory
+from PIL import Image
 
-from .models import Post, Comment, Hashtag
+from social_media import async_views, metrics
+from user.authentication import RefreshToken
+from user.models import Follow
+from user.views import UserViewSet
+from social_media.images import ImageStatus
+from social_media.throttling import LocalThrottleStore
+from social_media.response_cache import response_cache
+from social_media.testing import jpeg_upload
+from .likes import like_counter_buffer
+from . import likes, trending
+from .models import Post, Comment, Hashtag, HashtagUsage, TimelineEntry
+from .serializers import PostDetailSerializer
+from .views import CommentViewSet, PostViewSet
 
 
 class ViewTests(TestCase):
@@ -44,3 +77,1133 @@ class ViewTests(TestCase):
         self.user.followings.add(followed_user)
         response = self.client.post(reverse("post:post-detail", args=[post.id]) + "like-unlike/")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_new_post_fanned_out_to_followers(self):
+        author = get_user_model().objects.create_user(
+            email="author@email.com", password="testpass"
+        )
+        self.user.followings.add(author)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=author, content="test")
+
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+        response = self.client.get(reverse("post:post-list"))
+        self.assertIn(post.id, [item["id"] for item in response.data["results"]])
+
+    def test_follow_backfills_timeline(self):
+        author = get_user_model().objects.create_user(
+            email="author@email.com", password="testpass"
+        )
+        post = Post.objects.create(author=author, content="test")
+        self.user.followings.add(author)
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+
+        self.user.followings.remove(author)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_backfill_timelines_for_existing_posts(self):
+        small, large = (
+            get_user_model().objects.create_user(email=f"{name}@email.com", password="testpass")
+            for name in ("small", "large")
+        )
+        fan = get_user_model().objects.create_user(email="fan@email.com", password="testpass")
+        self.user.followings.add(small, large)
+        fan.followings.add(large)
+        posts = [Post.objects.create(author=author, content="test") for author in (small, large, self.user)]
+        TimelineEntry.objects.all().delete()
+
+        out = StringIO()
+        call_command("backfill_timelines", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Backfilled 4 timelines")
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(owner=self.user).values_list("post_id", flat=True)),
+            {posts[0].id, posts[2].id},
+        )
+        response = self.client.get(reverse("post:post-list"))
+        self.assertEqual([item["id"] for item in response.data["results"]], [post.id for post in reversed(posts)])
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True, TIMELINE_FANOUT_LIMIT=0)
+    def test_large_accounts_merged_at_read_time(self):
+        author = get_user_model().objects.create_user(
+            email="author@email.com", password="testpass"
+        )
+        self.user.followings.add(author)
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=author, content="test")
+
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.user, post=post).exists())
+        response = self.client.get(reverse("post:post-list"))
+        self.assertIn(post.id, [item["id"] for item in response.data["results"]])
+
+    def test_post_list_keyset_pagination(self):
+        posts = [Post.objects.create(author=self.user, content=f"test {i}") for i in range(5)]
+        url = reverse("post:post-list")
+
+        response = self.client.get(url, {"page_size": 2})
+        ids = [item["id"] for item in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [item["id"] for item in response.data["results"]]
+
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True, TIMELINE_FANOUT_LIMIT=1)
+    def test_feed_pages_merge_timeline_and_large_accounts(self):
+        small, large = (
+            get_user_model().objects.create_user(email=f"{name}@email.com", password="testpass")
+            for name in ("small", "large")
+        )
+        fan = get_user_model().objects.create_user(email="fan@email.com", password="testpass")
+        self.user.followings.add(small, large)
+        fan.followings.add(large)
+        posts = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(6):
+                posts.append(Post.objects.create(author=(small, large, self.user)[i % 3], content=f"test {i}"))
+
+        response = self.client.get(reverse("post:post-list"), {"page_size": 2})
+        ids = [item["id"] for item in response.data["results"]]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            ids += [item["id"] for item in response.data["results"]]
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+
+    def test_list_queryset_keeps_to_the_feed(self):
+        stranger = get_user_model().objects.create_user(email="stranger@email.com", password="testpass")
+        Post.objects.create(author=stranger, content="hidden")
+        own = Post.objects.create(author=self.user, content="mine")
+        request = Request(APIRequestFactory().get("/"))
+        request.user = self.user
+        view = PostViewSet(action="list", request=request, args=(), kwargs={}, format_kwarg=None)
+        self.assertEqual([post.id for post in view.get_queryset()], [own.id])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("post:post-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_post_list_query_count_is_fixed(self):
+        hashtag = Hashtag.objects.create(name="test")
+        for i in range(5):
+            post = Post.objects.create(author=self.user, content=f"test {i}")
+            post.hashtags.add(hashtag)
+            post.likes.add(self.user)
+            Comment.objects.create(author=self.user, post=post, content="test")
+        url = reverse("post:post-list")
+        self.client.get(url)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertEqual(response.data["results"][0]["likes"], 1)
+        self.assertEqual(response.data["results"][0]["comments"], 1)
+        self.assertEqual(len(response.data["results"][0]["latest_comments"]), 1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("post:Hashtag-list"))
+        self.assertEqual(response.data["results"][0]["posts"], 5)
+
+    def test_create_post_resolves_hashtags_in_batch(self):
+        Hashtag.objects.create(name="existing")
+        url = reverse("post:post-list")
+        payload = {
+            "author": self.user.id,
+            "content": "hello #Extra and #existing",
+            "created_at": timezone.now(),
+            "hashtags": [{"name": "#Existing"}, {"name": "new"}, {"name": "NEW"}],
+        }
+        with self.assertNumQueries(9):
+            response = self.client.post(url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        post = Post.objects.get(pk=response.data["id"])
+        self.assertEqual(sorted(post.hashtags.values_list("name", flat=True)), ["existing", "extra", "new"])
+        self.assertEqual(Hashtag.objects.count(), 3)
+
+    def test_invalid_hashtags_rejected(self):
+        url = reverse("post:post-list")
+        for hashtags in ([{}], [{"name": "#"}], [{"name": "x" * 61}]):
+            with self.subTest(hashtags=hashtags):
+                response = self.client.post(
+                    url,
+                    {"content": "test", "created_at": timezone.now(), "hashtags": hashtags},
+                    format="json",
+                )
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Hashtag.objects.exists())
+
+    def test_hashtag_rename_must_stay_unique(self):
+        hashtag, other = Hashtag.objects.create(name="first"), Hashtag.objects.create(name="second")
+        url = reverse("post:Hashtag-detail", args=[hashtag.id])
+        response = self.client.patch(url, {"name": "#Second"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {"name": "#First"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(other.name, Hashtag.objects.get(pk=other.pk).name)
+
+
+class LikeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+        self.url = reverse("post:post-like-state", args=[self.post.id])
+
+    def test_like_is_idempotent(self):
+        response = self.client.put(self.url)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.put(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.post.likes.count(), 1)
+
+    def test_unlike_is_idempotent(self):
+        self.client.put(self.url)
+        for _ in range(2):
+            response = self.client.delete(self.url)
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+    def test_toggle_updates_counter(self):
+        url = reverse("post:post-like", args=[self.post.id])
+        self.client.post(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.post(url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_m2m_writes_keep_counter_in_sync(self):
+        other_user = get_user_model().objects.create_user(
+            email="other@email.com", password="testpass"
+        )
+        self.post.likes.add(self.user, other_user)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+        other_user.likes.clear()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_batch_like_and_unlike(self):
+        author = get_user_model().objects.create_user(email="author@email.com", password="testpass")
+        self.user.followings.add(author)
+        followed = Post.objects.create(author=author, content="test")
+        hidden = Post.objects.create(
+            author=get_user_model().objects.create_user(email="hidden@email.com", password="testpass"),
+            content="test",
+        )
+        self.client.put(self.url)
+        url = reverse("post:post-like-batch")
+        missing = hidden.id + 1
+        ids = [self.post.id, followed.id, hidden.id, missing, followed.id]
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, {"posts": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"post": self.post.id, "liked": True, "changed": False},
+            {"post": followed.id, "liked": True, "changed": True},
+            {"post": hidden.id, "error": "not_found"},
+            {"post": missing, "error": "not_found"},
+        ])
+        statements = [q["sql"] for q in context.captured_queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 3)
+        self.assertEqual(
+            dict(Post.objects.filter(likes=self.user).values_list("pk", "like_count")),
+            {self.post.id: 1, followed.id: 1},
+        )
+
+        response = self.client.post(url, {"posts": [self.post.id, followed.id], "liked": False}, format="json")
+        self.assertEqual([item["changed"] for item in response.data["results"]], [True, True])
+        self.assertFalse(Post.objects.filter(likes=self.user).exists())
+        self.assertEqual(Post.objects.get(pk=followed.id).like_count, 0)
+
+    def test_feed_marks_viewer_state(self):
+        author = get_user_model().objects.create_user(email="author@email.com", password="testpass")
+        self.user.followings.add(author)
+        followed = Post.objects.create(author=author, content="test")
+        TimelineEntry.objects.create(owner=self.user, post=followed, created_at=followed.created_at)
+        self.client.put(self.url)
+
+        response = self.client.get(reverse("post:post-list"))
+        self.assertEqual(
+            {
+                item["id"]: (item["viewer_has_liked"], item["viewer_follows_author"])
+                for item in response.data["results"]
+            },
+            {self.post.id: (True, False), followed.id: (False, True)},
+        )
+
+    def test_batch_size_limited(self):
+        url = reverse("post:post-like-batch")
+        response = self.client.post(url, {"posts": list(range(1, settings.BATCH_MAX_IDS + 2))}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {"posts": []}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(LIKE_COUNTER_BUFFERED=True, LIKE_COUNTER_FLUSH_SIZE=1000)
+    def test_buffered_counter_flushes_in_batch(self):
+        like_counter_buffer.flush()
+        other_user = get_user_model().objects.create_user(
+            email="other@email.com", password="testpass"
+        )
+        other_user.followings.add(self.user)
+        with mock.patch.object(likes, "enqueue_later") as enqueue_later, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.url)
+            self.client.force_authenticate(user=other_user)
+            self.client.put(self.url)
+        # Only the first delta into an empty buffer schedules a flush.
+        enqueue_later.assert_called_once_with(settings.LIKE_COUNTER_FLUSH_INTERVAL, like_counter_buffer.flush)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+        like_counter_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+    @override_settings(LIKE_COUNTER_BUFFERED=True)
+    def test_rolled_back_like_is_not_counted(self):
+        like_counter_buffer.flush()
+        with mock.patch.object(likes, "enqueue_later"), self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                likes.like_posts({self.post.id}, self.user.id)
+                raise RuntimeError
+
+        like_counter_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+
+@override_settings(COMMENT_PREVIEW_SIZE=2)
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+        self.comments = [
+            Comment.objects.create(author=self.user, post=self.post, content=f"comment {i}") for i in range(3)
+        ]
+        self.reply = Comment.objects.create(
+            author=self.user, post=self.post, parent=self.comments[0], content="reply"
+        )
+
+    def comment(self, data, post=None):
+        return self.client.post(
+            reverse("post:comment-list") + f"?post_id={(post or self.post).id}", data
+        )
+
+    def test_post_payloads_carry_bounded_preview(self):
+        other = Post.objects.create(author=self.user, content="other")
+        Comment.objects.create(author=self.user, post=other, content="other comment")
+
+        detail = self.client.get(reverse("post:post-detail", args=[self.post.id])).data
+        self.assertEqual([comment["content"] for comment in detail["comments"]], ["comment 2", "comment 1"])
+        self.assertEqual(detail["comments_count"], 4)
+
+        with CaptureQueriesContext(connection) as context:
+            results = self.client.get(reverse("post:post-list")).data["results"]
+        previews = [
+            query["sql"] for query in context.captured_queries if "ROW_NUMBER()" in query["sql"]
+        ]
+        self.assertEqual(len(previews), 1)
+        self.assertEqual(
+            {post["id"]: [comment["content"] for comment in post["latest_comments"]] for post in results},
+            {self.post.id: ["comment 2", "comment 1"], other.id: ["other comment"]},
+        )
+
+    def test_list_top_level_comments(self):
+        response = self.client.get(reverse("post:comment-list"), {"post_id": self.post.id})
+        self.assertEqual(
+            [comment["content"] for comment in response.data["results"]], ["comment 2", "comment 1", "comment 0"]
+        )
+        self.assertEqual(response.data["results"][2]["replies"], 1)
+        response = self.client.get(reverse("post:comment-post", args=[self.post.id]))
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_list_requires_post(self):
+        response = self.client.get(reverse("post:comment-list"))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(reverse("post:comment-detail", args=[self.reply.id])).data["depth"], 1)
+
+    def test_replies_page(self):
+        nested = self.comment({"content": "nested", "parent": self.reply.id})
+        self.assertEqual(nested.status_code, status.HTTP_201_CREATED)
+        later = self.comment({"content": "later", "parent": self.comments[0].id})
+        nested = Comment.objects.get(pk=nested.data["id"])
+        self.assertEqual((nested.depth, nested.root_id), (2, self.comments[0].id))
+
+        url = reverse("post:comment-replies", args=[self.comments[0].id])
+        response = self.client.get(url, {"page_size": 1})
+        self.assertEqual([comment["content"] for comment in response.data["results"]], ["reply"])
+        self.assertEqual(response.data["results"][0]["replies"], 1)
+        response = self.client.get(response.data["next"])
+        self.assertEqual([comment["id"] for comment in response.data["results"]], [later.data["id"]])
+
+    def test_reply_must_be_on_same_post(self):
+        other = Post.objects.create(author=self.user, content="other")
+        response = self.comment({"content": "reply", "parent": self.comments[1].id}, post=other)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_parent_cannot_change_on_update(self):
+        other = Post.objects.create(author=self.user, content="other")
+        other_comment = Comment.objects.create(author=self.user, post=other, content="elsewhere")
+        url = reverse("post:comment-detail", args=[self.reply.id])
+        for parent in (other_comment.id, self.reply.id, None):
+            response = self.client.patch(url, {"content": "edited", "parent": parent}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.reply.refresh_from_db()
+        self.assertEqual((self.reply.parent_id, self.reply.content), (self.comments[0].id, "edited"))
+        self.comments[0].refresh_from_db()
+        self.assertEqual(self.comments[0].reply_count, 1)
+
+    def test_deleting_reply_updates_count(self):
+        self.reply.delete()
+        self.comments[0].refresh_from_db()
+        self.assertEqual(self.comments[0].reply_count, 0)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("post:Hashtag-trending")
+
+    def publish(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("post:post-list"), {
+                "author": self.user.id, "content": content, "created_at": timezone.now(),
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_new_posts_count_towards_trending(self):
+        for content in ("#django #python", "#django", "#django #python", "#rust"):
+            self.publish(content)
+        self.assertEqual(
+            sum(HashtagUsage.objects.filter(hashtag__name="django").values_list("count", flat=True)), 3
+        )
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag["name"] for tag in response.data["results"]], ["#django", "#python", "#rust"])
+        self.assertEqual(response.data["results"][0]["posts"], 3)
+        self.assertEqual(len(self.client.get(self.url, {"limit": 1}).data["results"]), 1)
+
+    def test_recent_use_outweighs_older_use(self):
+        old, new = Hashtag.objects.create(name="old"), Hashtag.objects.create(name="new")
+        now = timezone.now()
+        HashtagUsage.objects.create(hashtag=old, bucket=trending.bucket_start(now - timedelta(days=1)), count=10)
+        HashtagUsage.objects.create(hashtag=new, bucket=trending.bucket_start(now), count=3)
+        HashtagUsage.objects.create(hashtag=new, bucket=trending.bucket_start(now - timedelta(days=30)), count=100)
+
+        snapshot = trending.refresh_trending()
+        self.assertEqual([tag["name"] for tag in snapshot["results"]], ["#new", "#old"])
+        self.assertEqual(snapshot["results"][0]["posts"], 3)
+        self.assertEqual(HashtagUsage.objects.count(), 2)
+
+    def test_served_from_snapshot(self):
+        self.publish("#django")
+        self.client.get(self.url)
+        self.publish("#python")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual([tag["name"] for tag in response.data["results"]], ["#django"])
+
+    @override_settings(TRENDING_REFRESH_INTERVAL=0)
+    def test_stale_snapshot_rebuilt_in_background(self):
+        self.client.get(self.url)
+        self.publish("#django")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["results"], [])
+        response = self.client.get(self.url)
+        self.assertEqual([tag["name"] for tag in response.data["results"]], ["#django"])
+
+    @override_settings(TRENDING_COLD_WAIT=0)
+    def test_cold_snapshot_built_once(self):
+        self.publish("#django")
+        cache.add(trending.REFRESH_LOCK_KEY, True)
+        # Another request is building the first snapshot: wait, don't rebuild.
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["results"], [])
+        self.assertIsNone(cache.get(trending.SNAPSHOT_KEY))
+
+        cache.delete(trending.REFRESH_LOCK_KEY)
+        response = self.client.get(self.url)
+        self.assertEqual([tag["name"] for tag in response.data["results"]], ["#django"])
+        self.assertIsNone(cache.get(trending.REFRESH_LOCK_KEY))
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.reset_stats()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+        self.url = reverse("post:post-detail", args=[self.post.id])
+
+    def test_post_detail_served_from_cache(self):
+        self.client.get(self.url)
+        # Only the viewer's like is looked up; the payload itself is cached.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_cache.stats(), {"misses": 1, "builds": 1, "hits": 1})
+
+    def test_viewer_state_not_shared_through_cache(self):
+        other_user = get_user_model().objects.create_user(
+            email="other@email.com", password="testpass"
+        )
+        other_user.followings.add(self.user)
+        self.post.likes.add(other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(
+            (response.data["viewer_has_liked"], response.data["viewer_follows_author"]), (False, False)
+        )
+
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response_cache.stats()["hits"], 1)
+        self.assertEqual(
+            (response.data["viewer_has_liked"], response.data["viewer_follows_author"]), (True, True)
+        )
+
+    def test_comment_invalidates_post_detail(self):
+        self.client.get(self.url)
+        Comment.objects.create(author=self.user, post=self.post, content="new comment")
+        response = self.client.get(self.url)
+        self.assertEqual([comment["content"] for comment in response.data["comments"]], ["new comment"])
+
+    def test_profile_change_invalidates_post_detail(self):
+        self.client.get(self.url)
+        self.user.bio = "new bio"
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["author"]["bio"], "new bio")
+
+    def test_bump_during_build_is_not_stored_as_current(self):
+        serialize = PostDetailSerializer.to_representation
+
+        def bump_while_serializing(serializer, instance):
+            response_cache.bump(f"user:{self.user.id}")
+            return serialize(serializer, instance)
+
+        with mock.patch.object(PostDetailSerializer, "to_representation", bump_while_serializing):
+            self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(
+            response_cache.stats(), {"misses": 2, "builds": 2, "discarded_builds": 1}
+        )
+
+    def test_cached_post_hidden_from_non_followers(self):
+        self.client.get(self.url)
+        other_user = get_user_model().objects.create_user(
+            email="other@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_hashtag_detail_invalidated_by_new_post(self):
+        hashtag = Hashtag.objects.create(name="test")
+        url = reverse("post:Hashtag-detail", args=[hashtag.id])
+        self.client.get(url)
+        self.post.hashtags.add(hashtag)
+        response = self.client.get(url)
+        self.assertEqual([post["id"] for post in response.data["posts"]], [self.post.id])
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.author = get_user_model().objects.create_user(
+            email="author@email.com", password="testpass"
+        )
+        self.user.followings.add(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = Post.objects.create(author=self.author, content="test #django")
+        self.post.hashtags.add(Hashtag.objects.create(name="django"))
+
+    def revalidate(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("private", response["Cache-Control"])
+        return response, self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_post_detail(self):
+        url = reverse("post:post-detail", args=[self.post.id])
+        response, _ = self.revalidate(url)
+        # The viewer's like is the only lookup.
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated["ETag"], response["ETag"])
+        revalidated = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put(reverse("post:post-like-state", args=[self.post.id]))
+        liked = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(liked.status_code, status.HTTP_200_OK)
+        self.assertTrue(liked.data["viewer_has_liked"])
+        self.assertNotEqual(liked["ETag"], response["ETag"])
+
+    def test_etag_is_per_user(self):
+        url = reverse("post:post-detail", args=[self.post.id])
+        response = self.client.get(url)
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_and_hashtag(self):
+        for url in (
+            reverse("user:user-detail", args=[self.author.id]),
+            reverse("post:Hashtag-detail", args=[self.post.hashtags.get().id]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        url = reverse("user:user-detail", args=[self.author.id])
+        response = self.client.get(url)
+        self.author.bio = "new bio"
+        self.author.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, status.HTTP_200_OK)
+
+    def test_feed_page(self):
+        url = reverse("post:post-list")
+        response, revalidated = self.revalidate(url)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.assertNumQueries(1):
+            self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+        Comment.objects.create(author=self.author, post=self.post, content="new comment")
+        commented = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(commented.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.author, content="newer")
+        published = self.client.get(url, HTTP_IF_NONE_MATCH=commented["ETag"])
+        self.assertEqual(published.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(published.data["results"]), 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_feed_page_with_large_accounts(self):
+        response, revalidated = self.revalidate(reverse("post:post-list"))
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.post.id])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class QueryBudgetTests(TestCase):
+    """Each endpoint must stay within its query budget regardless of data size."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.hashtag = Hashtag.objects.create(name="test")
+        for i in range(5):
+            author = get_user_model().objects.create_user(
+                email=f"author{i}@email.com", password="testpass"
+            )
+            self.user.followings.add(author)
+            author.followers.add(self.user)
+            post = Post.objects.create(author=author, content=f"test {i}")
+            post.hashtags.add(self.hashtag)
+            post.likes.add(self.user)
+            for number in range(3):
+                Comment.objects.create(author=author, post=post, content=f"comment {number}")
+        self.post = post
+
+    def assert_max_queries(self, url, max_queries):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(
+            len(context.captured_queries),
+            max_queries,
+            "\n".join(query["sql"] for query in context.captured_queries),
+        )
+        return response
+
+    def test_post_detail(self):
+        response = self.assert_max_queries(reverse("post:post-detail", args=[self.post.id]), 6)
+        self.assertEqual(len(response.data["comments"]), 3)
+        self.assertEqual(response.data["likes"], 1)
+
+    def test_hashtag_detail(self):
+        response = self.assert_max_queries(reverse("post:Hashtag-detail", args=[self.hashtag.id]), 5)
+        self.assertEqual(len(response.data["posts"]), 5)
+
+    def test_user_posts(self):
+        url = reverse("user:user-detail", args=[self.post.author_id]) + "posts/"
+        response = self.assert_max_queries(url, 5)
+        self.assertEqual(len(response.data["results"][0]["comments"]), 3)
+
+    def test_user_liked_posts(self):
+        url = reverse("user:user-detail", args=[self.user.id]) + "liked-posts/"
+        response = self.assert_max_queries(url, 5)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_user_followings(self):
+        url = reverse("user:user-detail", args=[self.user.id]) + "following/"
+        response = self.assert_max_queries(url, 4)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_user_detail(self):
+        self.assert_max_queries(reverse("user:user-detail", args=[self.user.id]), 3)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ImageUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+        self.url = reverse("post:post-detail", args=[self.post.id]) + "upload-image/"
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def upload(self, *files):
+        return self.client.post(self.url, {"images": list(files)}, format="multipart")
+
+    def test_upload_is_processed_in_background(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload(jpeg_upload("red"), jpeg_upload("blue"))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual([image["position"] for image in response.data], [0, 1])
+        self.assertEqual({image["status"] for image in response.data}, {ImageStatus.PENDING})
+
+        for callback in callbacks:
+            callback()
+        image = self.post.images.first()
+        self.assertEqual(image.image_status, ImageStatus.READY)
+        self.assertEqual(set(image.image_renditions), {"thumbnail", "small", "medium", "large"})
+        self.assertEqual(image.image.name, image.image_renditions["large"])
+        self.assertEqual((image.width, image.height), (800, 600))
+        self.assertTrue(image.placeholder.startswith("data:image/webp;base64,"))
+        self.assertEqual(default_storage.listdir("uploads/posts/incoming")[1], [])
+
+        with default_storage.open(image.image_renditions["thumbnail"]) as file, Image.open(file) as thumbnail:
+            self.assertEqual(thumbnail.format, "WEBP")
+            self.assertEqual(thumbnail.size, (160, 120))
+            self.assertNotIn(0x010F, thumbnail.getexif())
+
+        response = self.client.get(reverse("post:post-detail", args=[self.post.id]))
+        self.assertEqual(len(response.data["images"]), 2)
+        self.assertTrue(response.data["images"][0]["renditions"]["small"].endswith("small.webp"))
+
+    def test_duplicate_upload_reuses_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(jpeg_upload())
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload(jpeg_upload())
+        self.assertEqual(callbacks, [])
+        self.assertEqual(response.data[0]["position"], 1)
+        self.assertEqual(response.data[0]["status"], ImageStatus.READY)
+        first, second = self.post.images.all()
+        self.assertEqual(second.image_renditions, first.image_renditions)
+        self.assertEqual(second.placeholder, first.placeholder)
+
+    def test_corrupt_upload_is_marked_failed(self):
+        exif = Image.Exif()
+        exif[0x010F] = "Camera maker"
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        Image.new("RGB", (80, 60)).save(buffer, "JPEG", exif=exif)
+        # Retag the maker as ImageWidth: a text width passes verify() but
+        # makes exif_transpose fail with struct.error.
+        data = buffer.getvalue().replace(b"\x01\x0f\x00\x02", b"\x01\x00\x00\x02", 1)
+        corrupt = SimpleUploadedFile("photo.jpg", data, content_type="image/jpeg")
+
+        with self.assertLogs("social_media.images", "ERROR"), self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(corrupt)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        image = self.post.images.get()
+        self.assertEqual(image.image_status, ImageStatus.FAILED)
+        self.assertEqual(default_storage.listdir("uploads/posts/incoming")[1], [])
+
+    def test_upload_requires_images(self):
+        self.assertEqual(self.upload().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_post_list_loads_images_in_one_query(self):
+        def list_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse("post:post-list"))
+            return response, len(context.captured_queries)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(jpeg_upload())
+        list_queries()
+        _, one_post = list_queries()
+        for _ in range(3):
+            post = Post.objects.create(author=self.user, content="test")
+            self.url = reverse("post:post-detail", args=[post.id]) + "upload-image/"
+            with self.captureOnCommitCallbacks(execute=True):
+                self.upload(jpeg_upload())
+        response, four_posts = list_queries()
+
+        self.assertEqual(four_posts, one_post)
+        self.assertEqual([len(post["images"]) for post in response.data["results"]], [1] * 4)
+
+
+THROTTLE_RATES = {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], "likes": "2/min"}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": THROTTLE_RATES})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+
+    def test_like_budget_is_separate(self):
+        url = reverse("post:post-detail", args=[self.post.id]) + "like-unlike/"
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(self.client.get(reverse("post:post-list")).status_code, status.HTTP_200_OK)
+
+    def test_gcra_allows_burst_then_refills(self):
+        store = LocalThrottleStore("default")
+        self.assertEqual([store.acquire("key", 10, 30, 100) for _ in range(3)], [None] * 3)
+        self.assertEqual(store.acquire("key", 10, 30, 100), 10)
+        self.assertIsNone(store.acquire("key", 10, 30, 110))
+        self.assertEqual(store.acquire("key", 10, 30, 110), 10)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        response_cache.reset_stats()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def metrics(self):
+        return self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret").content.decode()
+
+    def test_requests_recorded_by_action(self):
+        self.client.get(reverse("post:post-list"))
+        self.client.post(reverse("post:post-like", args=[self.post.id]))
+        self.client.get(reverse("post:post-detail", args=[self.post.id]))
+
+        body = self.metrics()
+        self.assertIn('http_requests_total{view="PostViewSet.list",status="200"} 1', body)
+        self.assertIn('http_requests_total{view="PostViewSet.like",status="201"} 1', body)
+        self.assertIn('http_request_db_queries_count{view="PostViewSet.like"} 1', body)
+        self.assertIn('http_request_serializer_duration_seconds_count{view="PostViewSet.list"} 1', body)
+        self.assertIn('response_cache_events_total{event="misses"} 1', body)
+
+        queries = metrics.registry.summaries["http_request_db_queries"]["PostViewSet.like"]
+        self.assertGreater(queries.sum, 0)
+        size = metrics.registry.summaries["http_response_size_bytes"]["PostViewSet.retrieve"]
+        self.assertGreater(size.sum, 0)
+
+    def test_histogram_quantiles(self):
+        histogram = metrics.Histogram(scale=1000)
+        for value in range(1, 10_001):
+            histogram.record(value / 1000)
+        self.assertEqual(histogram.count, 10_000)
+        for quantile in (0.5, 0.95, 0.99):
+            self.assertAlmostEqual(histogram.quantile(quantile), quantile * 10, delta=quantile * 10 / 16)
+        self.assertEqual(histogram.quantile(1), 10)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_request_logged_with_queries(self):
+        with self.assertLogs("social_media.metrics", "WARNING") as logs:
+            self.client.get(reverse("post:post-list"))
+        self.assertIn("PostViewSet.list", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_closed_without_token(self):
+        response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_serializers_outside_views_are_not_patched(self):
+        self.assertEqual(BaseSerializer.data.fget.__module__, "rest_framework.serializers")
+        serializer = PostDetailSerializer(self.post)
+        self.assertIs(type(serializer), PostDetailSerializer)
+        self.assertEqual(serializer.data["id"], self.post.id)
+
+
+class AsyncReadTests(TransactionTestCase):
+    """Committed rows, so prefetches run concurrently on other connections."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="hello #async")
+        self.post.hashtags.add(Hashtag.objects.create(name="async"))
+        Comment.objects.create(author=self.user, post=self.post, content="first")
+
+    def test_hot_read_paths_are_async(self):
+        for url in (
+            reverse("post:post-list"),
+            reverse("post:post-detail", args=[self.post.id]),
+            reverse("post:comment-list"),
+            reverse("user:user-detail", args=[self.user.id]) + "followers/",
+            reverse("user:user-detail", args=[self.user.id]) + "posts/",
+        ):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(url).func), url)
+
+    def test_prefetches_run_on_query_threads(self):
+        threads = []
+
+        def prefetch(*args):
+            threads.append(threading.current_thread().name)
+            return prefetch_related_objects(*args)
+
+        prefetch_related_objects = async_views.prefetch_related_objects
+        with mock.patch.object(async_views, "prefetch_related_objects", prefetch):
+            response = self.client.get(reverse("post:post-detail", args=[self.post.id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag["name"] for tag in response.data["hashtags"]], ["#async"])
+        self.assertEqual(len(response.data["comments"]), 1)
+        self.assertEqual(len(threads), 4)
+        self.assertTrue(all(name.startswith("async-query") for name in threads))
+
+    def test_user_posts_page(self):
+        response = self.client.get(reverse("user:user-detail", args=[self.user.id]) + "posts/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post["id"] for post in response.data["results"]], [self.post.id])
+
+    async def test_served_over_asgi(self):
+        access = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.get(
+            reverse("post:post-list"), AUTHORIZATION=f"Bearer {access}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post["id"] for post in response.json()["results"]], [self.post.id])
+
+    def test_unauthenticated_list_rejected(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse("post:post-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_query_thread_queries_counted(self):
+        metrics.registry.reset()
+        self.client.get(reverse("post:post-detail", args=[self.post.id]))
+        queries = metrics.registry.summaries["http_request_db_queries"]["PostViewSet.retrieve"]
+        self.assertEqual(queries.count, 1)
+        self.assertEqual(queries.sum, 6)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN output is PostgreSQL's")
+class QueryPlanTests(TestCase):
+    """The feed, comment and profile querysets must be answered from indexes.
+
+    A synthetic graph is seeded with ``seed_social_graph``, so the planner
+    costs each plan against tables large enough that a sequential scan, or
+    an index walked end to end with a filter, means the query has no index
+    to use.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "seed_social_graph",
+            users=5_000,
+            posts=10_000,
+            hashtags=1_000,
+            follows_per_user=10,
+            likes_per_post=2,
+            comments_per_post=1,
+            stdout=StringIO(),
+        )
+        with connection.cursor() as cursor:
+            # Check the deferred foreign keys once here, not again after every test.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        cls.user = get_user_model().objects.annotate(
+            following=Count("following_edges"),
+        ).order_by("-following").first()
+        cls.post = Post.objects.filter(author=cls.user).first() or Post.objects.first()
+
+    def setUp(self):
+        cache.clear()
+
+    def view_queryset(self, viewset, action, query=None, **kwargs):
+        request = Request(APIRequestFactory().get("/", query))
+        request.user = self.user
+        initkwargs = getattr(getattr(viewset, action), "kwargs", {})
+        view = viewset(**initkwargs, action=action, request=request, args=(), kwargs=kwargs, format_kwarg=None)
+        if action in ("followers", "following", "posts", "liked_posts"):
+            queryset = view.get_related_queryset()
+        else:
+            queryset = view.get_queryset()
+        if action == "retrieve":
+            return queryset.filter(pk=kwargs["pk"])
+        return view.paginator.get_page_queryset(queryset, request, view)
+
+    def full_scans(self, plan):
+        """Scans that read a whole table, or a whole index in order."""
+        if plan["Node Type"] == "Seq Scan" or (
+            plan["Node Type"] in ("Index Scan", "Index Only Scan") and "Index Cond" not in plan
+        ):
+            yield f"{plan['Node Type']} on {plan['Relation Name']}"
+        for child in plan.get("Plans", ()):
+            yield from self.full_scans(child)
+
+    def assert_index_only(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0][0]["Plan"]
+        self.assertEqual(list(self.full_scans(plan)), [], queryset.explain())
+
+    def test_home_timeline(self):
+        self.assert_index_only(self.view_queryset(PostViewSet, "list"))
+
+    def test_home_timeline_by_hashtag(self):
+        self.assert_index_only(self.view_queryset(PostViewSet, "list", {"hashtags": "topic7"}))
+
+    def test_home_timeline_by_author_last_name(self):
+        self.assert_index_only(self.view_queryset(PostViewSet, "list", {"author_last_name": f"last{self.user.pk}"}))
+
+    def test_post_detail(self):
+        self.assert_index_only(self.view_queryset(PostViewSet, "retrieve", pk=self.post.pk))
+
+    def test_post_comments(self):
+        self.assert_index_only(self.view_queryset(CommentViewSet, "list", {"post_id": self.post.pk}))
+
+    def test_comment_replies(self):
+        comment = Comment.objects.filter(reply_count__gt=0).first()
+        self.assert_index_only(self.view_queryset(CommentViewSet, "replies", pk=comment.pk))
+
+    def test_comment_previews(self):
+        page = list(self.view_queryset(PostViewSet, "list").prefetch_related(None))
+        self.assert_index_only(Post.comment_preview.get_prefetch_queryset(page)[0])
+
+    def test_user_by_email(self):
+        self.assert_index_only(self.view_queryset(UserViewSet, "list", {"email": f"USER{self.user.pk}@example.com"}))
+
+    def test_user_pages(self):
+        for action in ("followers", "following", "posts", "liked_posts"):
+            with self.subTest(action=action):
+                self.assert_index_only(self.view_queryset(UserViewSet, action, pk=self.user.pk))
+
+
+class SeedSocialGraphTests(TransactionTestCase):
+    def setUp(self):
+        call_command(
+            "seed_social_graph",
+            users=200,
+            posts=500,
+            hashtags=20,
+            follows_per_user=10,
+            stdout=StringIO(),
+        )
+
+    def test_graph(self):
+        self.assertEqual(get_user_model().objects.count(), 200)
+        self.assertEqual(Post.objects.count(), 500)
+        followers = sorted(
+            get_user_model().objects.annotate(n=Count("follower_edges")).values_list("n", flat=True)
+        )
+        self.assertGreater(followers[-1], 5 * followers[len(followers) // 2])
+        self.assertFalse(
+            Post.objects.annotate(n=Count("likes")).exclude(like_count=F("n")).exists()
+        )
+        for post in Post.objects.filter(hashtags__isnull=False).prefetch_related("hashtags")[:5]:
+            for hashtag in post.hashtags.all():
+                self.assertIn(f"#{hashtag.name}", post.content)
+        self.assertEqual(
+            HashtagUsage.objects.aggregate(n=Sum("count"))["n"], Post.hashtags.through.objects.count()
+        )
+
+    def test_timelines_match_fan_out(self):
+        post = Post.objects.annotate(n=Count("author__follower_edges")).order_by("-n").first()
+        self.assertEqual(
+            set(post.timeline_entries.values_list("owner_id", flat=True)),
+            {post.author_id, *Follow.objects.filter(followee=post.author).values_list("follower_id", flat=True)},
+        )
+
+    def test_new_rows_after_seeding(self):
+        user = get_user_model().objects.first()
+        response = APIClient().post(
+            reverse("user:user-obtain-pair"), {"email": user.email, "password": "password"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        Post.objects.create(author=user, content="after seeding")
+        get_user_model().objects.create_user(email="new@example.com", password="password")
+
+    def test_benchmark(self):
+        output = StringIO()
+        call_command("benchmark_api", requests=4, concurrency=2, users=2, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report["database"]["posts"], 500)
+        for name, result in report["endpoints"].items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(result["errors"], 0)
+                self.assertGreater(result["queries_per_request"], 0)
@@ -0,0 +1,163 @@
+"""Materialized home timelines.
+
+Every post is written to its author's timeline right away and pushed to the
+followers' timelines by a background task (fan-out-on-write). Authors with
+more than ``TIMELINE_FANOUT_LIMIT`` followers are not fanned out; their posts
+are merged into the feed at read time instead (fan-out-on-read).
+
+Feed pages are keyed on the timeline entries' ``created_at`` and seek on
+``timeline_owner_created_idx``; posts of those big authors come from a
+second branch, ordered and limited on its own, and the two are merged with
+a ``UNION`` of at most two pages of ids.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from social_media.db import SubqueryCount, TopPerGroup
+from social_media.pagination import KeysetPagination
+from social_media.tasks import enqueue
+from user.models import Follow
+from .models import Post, TimelineEntry
+
+PULL_AUTHORS_CACHE_KEY = "timeline:pull-authors:{}"
+PULL_AUTHORS_CACHE_TIMEOUT = 300
+FANOUT_BATCH_SIZE = 1000
+
+
+def _follower_ids(author_id):
+    return Follow.objects.filter(followee_id=author_id).values_list("follower_id", flat=True)
+
+
+def publish_post(post):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=post.author_id, post=post, created_at=post.created_at)],
+        ignore_conflicts=True,
+    )
+    enqueue(fan_out_post, post.pk)
+
+
+def fan_out_post(post_id):
+    post = Post.objects.filter(pk=post_id).only("author_id", "created_at").first()
+    if post is None:
+        return
+
+    follower_ids = _follower_ids(post.author_id)
+    if follower_ids.count() > settings.TIMELINE_FANOUT_LIMIT:
+        return
+
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(TimelineEntry(owner_id=follower_id, post_id=post.pk, created_at=post.created_at))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_timeline(owner_id, author_ids):
+    """Copy the latest posts of newly followed authors into a timeline.
+
+    One query reads the posts of all ``author_ids`` and one insert writes them.
+    """
+    latest = TopPerGroup(
+        Post.objects.filter(author_id__in=author_ids), "author_id", ["-created_at", "-id"],
+        settings.TIMELINE_BACKFILL_SIZE,
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=owner_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in Post.objects.filter(pk__in=latest).values_list("pk", "created_at")
+        ],
+        ignore_conflicts=True,
+    )
+    cache.delete(PULL_AUTHORS_CACHE_KEY.format(owner_id))
+
+
+def backfill_all_timelines():
+    """Fill every user's timeline from the follow graph; returns how many were filled.
+
+    For posts written before timelines existed. Authors too big to fan out
+    are left to the read-time merge, as for new posts.
+    """
+    pull_authors = set(
+        Follow.objects.values("followee_id")
+        .annotate(follower_count=Count("id"))
+        .filter(follower_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list("followee_id", flat=True)
+    )
+    filled = 0
+    for user_id in get_user_model().objects.order_by("pk").values_list("pk", flat=True).iterator():
+        followee_ids = Follow.objects.filter(follower_id=user_id).values_list("followee_id", flat=True)
+        backfill_timeline(user_id, [user_id, *(pk for pk in followee_ids if pk not in pull_authors)])
+        filled += 1
+    return filled
+
+
+def remove_from_timeline(owner_id, author_ids=None):
+    entries = TimelineEntry.objects.filter(owner_id=owner_id).exclude(post__author_id=owner_id)
+    if author_ids is not None:
+        entries = entries.filter(post__author_id__in=author_ids)
+    entries.delete()
+    cache.delete(PULL_AUTHORS_CACHE_KEY.format(owner_id))
+
+
+def pull_author_ids(user):
+    """Followed accounts that are too big to fan out, cached per reader."""
+    key = PULL_AUTHORS_CACHE_KEY.format(user.pk)
+    author_ids = cache.get(key)
+    if author_ids is None:
+        author_ids = list(
+            Follow.objects.filter(follower_id=user.pk)
+            .annotate(follower_count=SubqueryCount(Follow.objects.filter(followee=OuterRef("followee"))))
+            .filter(follower_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+            .values_list("followee_id", flat=True)
+        )
+        cache.set(key, author_ids, PULL_AUTHORS_CACHE_TIMEOUT)
+    return author_ids
+
+
+FEED_ORDERING = ("-feed_created_at", "-id")
+
+
+def home_timeline(user, queryset, seek=Q(), limit=None):
+    """The posts of ``queryset`` in ``user``'s feed past ``seek``, newest first.
+
+    Each branch is ordered and cut to ``limit`` before the ``UNION``, so a
+    page reads ``limit`` timeline entries at most, however long the
+    timeline is. Rows are annotated with ``feed_created_at``.
+    """
+    branches = [
+        queryset.filter(timeline_entries__owner_id=user.pk).annotate(feed_created_at=F("timeline_entries__created_at"))
+    ]
+    author_ids = pull_author_ids(user)
+    if author_ids:
+        branches.append(queryset.filter(author_id__in=author_ids).annotate(feed_created_at=F("created_at")))
+    first, *others = (branch.filter(seek).order_by(*FEED_ORDERING).values("pk")[:limit] for branch in branches)
+    entries = TimelineEntry.objects.filter(owner_id=user.pk, post=OuterRef("pk")).values("created_at")
+    return queryset.filter(pk__in=first.union(*others) if others else first).annotate(
+        feed_created_at=Coalesce(Subquery(entries), F("created_at")),
+    ).order_by(*FEED_ORDERING)[:limit]
+
+
+class TimelineKeysetPagination(KeysetPagination):
+    """Home feed pages of the queryset's posts, newest timeline entry first."""
+    ordering = FEED_ORDERING
+
+    def get_page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        position = self.decode_cursor(request, queryset.model)
+        seek = Q() if position is None else self.get_position_filter(position)
+        return home_timeline(request.user, queryset, seek, self.page_size + 1)
+
+    @staticmethod
+    def _to_python(model, field_name, value):
+        if field_name == "feed_created_at":
+            return TimelineEntry._meta.get_field("created_at").to_python(value)
+        return KeysetPagination._to_python(model, field_name, value)
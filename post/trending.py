@@ -0,0 +1,117 @@
+"""Trending hashtags from time-decayed usage counters.
+
+Every hashtag attached to a new post adds one to its ``HashtagUsage``
+counter for the ``TRENDING_BUCKET_SECONDS`` bucket the post was created in,
+with one upsert off the request path. ``refresh_trending`` scores all tags
+at once with NumPy, weighting each bucket by ``0.5 ** (age / half-life)``,
+and caches the top ``TRENDING_SIZE`` as a snapshot. ``/Hashtag/trending/``
+only reads that snapshot; once it is older than ``TRENDING_REFRESH_INTERVAL``
+the next request recomputes it in the background. ``manage.py
+refresh_trending`` does the same from cron. Without a snapshot one request
+builds it under ``REFRESH_LOCK_KEY`` while the others wait for it.
+"""
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from social_media.tasks import enqueue
+from .models import Hashtag, HashtagUsage
+
+SNAPSHOT_KEY = "trending:snapshot"
+REFRESH_LOCK_KEY = "trending:refresh-lock"
+LOCK_POLL_INTERVAL = 0.05
+
+
+def bucket_start(when):
+    timestamp = int(when.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % settings.TRENDING_BUCKET_SECONDS, tz=dt_timezone.utc)
+
+
+def record_usage(hashtag_ids, when):
+    """Count one use of each of ``hashtag_ids`` at ``when``."""
+    if not hashtag_ids:
+        return
+    table = connection.ops.quote_name(HashtagUsage._meta.db_table)
+    bucket = connection.ops.adapt_datetimefield_value(bucket_start(when))
+    values = ", ".join(["(%s, %s, 1)"] * len(hashtag_ids))
+    with connection.cursor() as cursor:
+        # Sorted, so concurrent upserts lock shared rows in the same order.
+        cursor.execute(
+            f"INSERT INTO {table} (hashtag_id, bucket, count) VALUES {values} "
+            f"ON CONFLICT (hashtag_id, bucket) DO UPDATE SET count = {table}.count + 1",
+            [value for hashtag_id in sorted(hashtag_ids) for value in (hashtag_id, bucket)],
+        )
+
+
+def compute_trending(now=None):
+    """Decayed scores of every tag used in the window; returns the top ones."""
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    rows = list(HashtagUsage.objects.filter(bucket__gte=since).values_list("hashtag_id", "bucket", "count"))
+    if not rows:
+        return []
+
+    hashtag_ids, buckets, counts = zip(*rows)
+    counts = np.array(counts, dtype=np.float64)
+    ages = (now.timestamp() - np.array([bucket.timestamp() for bucket in buckets])) / 3600
+    tags, index = np.unique(np.array(hashtag_ids), return_inverse=True)
+    scores = np.bincount(index, weights=counts * np.exp2(-ages / settings.TRENDING_HALF_LIFE_HOURS))
+    posts = np.bincount(index, weights=counts)
+
+    size = min(settings.TRENDING_SIZE, len(tags))
+    top = np.argpartition(-scores, size - 1)[:size]
+    top = top[np.lexsort((tags[top], -scores[top]))]
+    names = dict(Hashtag.objects.filter(pk__in=tags[top].tolist()).values_list("pk", "name"))
+    return [
+        {"id": int(tags[i]), "name": f"#{names[tags[i]]}", "score": round(float(scores[i]), 3), "posts": int(posts[i])}
+        for i in top
+        if tags[i] in names
+    ]
+
+
+def refresh_trending():
+    now = timezone.now()
+    snapshot = {"computed_at": now.isoformat(), "results": compute_trending(now)}
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    HashtagUsage.objects.filter(bucket__lt=now - timedelta(days=settings.TRENDING_WINDOW_DAYS)).delete()
+    cache.delete(REFRESH_LOCK_KEY)
+    return snapshot
+
+
+def get_trending():
+    """The current snapshot; a stale one is served while it is rebuilt."""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return _build_cold()
+    age = timezone.now() - datetime.fromisoformat(snapshot["computed_at"])
+    if age.total_seconds() >= settings.TRENDING_REFRESH_INTERVAL and cache.add(
+        REFRESH_LOCK_KEY, True, settings.TRENDING_REFRESH_INTERVAL
+    ):
+        enqueue(refresh_trending)
+    return snapshot
+
+
+def _build_cold():
+    """Build the first snapshot once, however many requests arrive for it.
+
+    Requests that find the build under way wait for its snapshot, and get an
+    empty one if it is not ready within ``TRENDING_COLD_WAIT`` seconds.
+    """
+    if cache.add(REFRESH_LOCK_KEY, True, settings.TRENDING_REFRESH_INTERVAL):
+        try:
+            return refresh_trending()
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+
+    deadline = time.monotonic() + settings.TRENDING_COLD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+    return {"computed_at": timezone.now().isoformat(), "results": []}
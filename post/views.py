@@ -1,16 +1,37 @@
-from django.db.models import Q
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from .models import Hashtag, Post, Comment
+
+from social_media.async_views import AsyncReadMixin
+from social_media.conditional import make_etag, not_modified, set_validators
+from social_media.metrics import SerializerTimingMixin
+from social_media.pagination import CreatedAtAscKeysetPagination, CreatedAtKeysetPagination
+from social_media.query_plans import QueryPlan, QueryPlanMixin
+from social_media.response_cache import CachedRetrieveMixin, response_cache
+from user.authentication import StatelessJWTAuthentication
+from user.follows import is_following
+from user.models import Follow
+from .models import Hashtag, Like, Post, Comment
 from .permissions import IsAuthorOrIfAuthenticatedReadOnly
+from .hashtags import normalize_hashtag
+from .images import add_images
+from .likes import like_post, like_posts, toggle_like, unlike_post, unlike_posts
+from .timeline import TimelineKeysetPagination
+from .trending import get_trending
 from .serializers import (
     PostSerializer,
     PostListSerializer,
     PostDetailSerializer,
     PostImageSerializer,
+    PostImageUploadSerializer,
+    LikeBatchSerializer,
     CommentSerializer,
     HashtagSerializer,
     HashtagListSerializer,
@@ -18,14 +39,43 @@ from .serializers import (
 )
 
 
-class HashtagViewSet(mixins.ListModelMixin,
+COMMENT_PREVIEW = Prefetch("comment_preview", to_attr="comment_preview")
+POST_LIST_PLAN = QueryPlan(
+    select_related=("author",),
+    prefetch_related=("hashtags", "images", COMMENT_PREVIEW),
+    annotate=("with_counts",),
+)
+POST_DETAIL_PLAN = QueryPlan(
+    select_related=("author",),
+    prefetch_related=(
+        "author__followers",
+        "author__followings",
+        "hashtags",
+        "images",
+        COMMENT_PREVIEW,
+    ),
+    annotate=("with_counts",),
+)
+
+
+class HashtagViewSet(SerializerTimingMixin,
+                     QueryPlanMixin,
+                     CachedRetrieveMixin,
+                     mixins.ListModelMixin,
                      mixins.UpdateModelMixin,
                      mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet):
     serializer_class = HashtagSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated]
     queryset = Hashtag.objects.all()
+    cache_namespace = "hashtag"
+    query_plans = {
+        "list": QueryPlan(annotate=("with_counts",)),
+        "retrieve": QueryPlan(
+            prefetch_related=(Prefetch("posts", queryset=POST_LIST_PLAN.apply(Post.objects.all())),),
+        ),
+    }
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -34,12 +84,104 @@ class HashtagViewSet(mixins.ListModelMixin,
             return HashtagDetailSerializer
         return self.serializer_class
 
+    def get_queryset(self):
+        return self.plan_queryset(self.queryset)
+
+    @action(detail=False, methods=["GET"])
+    def trending(self, request):
+        """Top hashtags by recent, time-decayed use, from a periodically rebuilt snapshot."""
+        snapshot = get_trending()
+        try:
+            limit = int(request.query_params.get("limit", settings.TRENDING_SIZE))
+        except ValueError:
+            raise ValidationError({"limit": "A number is required."})
+        return Response({**snapshot, "results": snapshot["results"][:max(limit, 0)]})
+
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(SerializerTimingMixin,
+                  AsyncReadMixin,
+                  QueryPlanMixin,
+                  CachedRetrieveMixin,
+                  viewsets.ModelViewSet):
+    """The home feed, and the posts of followed accounts and one's own.
+
+    ``get_queryset`` limits every action to those posts;
+    ``TimelineKeysetPagination`` orders ``list`` pages as the home feed.
+    """
     serializer_class = PostSerializer
-    authentication_classes = [JWTAuthentication]
+    pagination_class = TimelineKeysetPagination
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthenticated, IsAuthorOrIfAuthenticatedReadOnly]
     queryset = Post.objects.all()
+    cache_namespace = "post"
+    viewer_fields = ("viewer_has_liked", "viewer_follows_author")
+    throttle_scope = None
+    query_plans = {
+        "list": POST_LIST_PLAN,
+        "retrieve": POST_DETAIL_PLAN,
+    }
+
+    def get_cache_dependencies(self, instance):
+        return super().get_cache_dependencies(instance) + [f"user:{instance.author_id}"]
+
+    def get_cache_meta(self, instance):
+        return {"author_id": instance.author_id}
+
+    def has_cached_access(self, meta):
+        user = self.request.user
+        return user.is_authenticated and (
+            meta["author_id"] == user.pk or is_following(user.pk, meta["author_id"])
+        )
+
+    def get_page_etag(self, rows):
+        """Validator of a feed page from its ``(post id, author id)`` rows.
+
+        Post versions move with likes, comments, images and edits, author
+        versions with profile and follow changes, and the viewer's version
+        with their follows.
+        """
+        user_id = self.request.user.pk
+        versions = response_cache.get_versions({
+            f"user:{user_id}",
+            *(f"post:{pk}" for pk, _ in rows),
+            *(f"user:{author_id}" for _, author_id in rows),
+        })
+        return make_etag(self.request.get_full_path(), user_id, rows, versions)
+
+    def get_page_rows(self):
+        """The ``(post id, author id)`` rows of the requested page, from the index alone."""
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginator.get_page_queryset(queryset, self.request, view=self)
+        return [list(row) for row in page.prefetch_related(None).values_list("pk", "author_id")]
+
+    def page_not_modified(self, request):
+        if "If-None-Match" not in request.headers:
+            return None
+        rows = self.get_page_rows()[:self.paginator.page_size]
+        return not_modified(request, self.get_page_etag(rows))
+
+    def set_page_validators(self, response):
+        rows = [[post.pk, post.author_id] for post in self.paginator.page]
+        return set_validators(response, self.get_page_etag(rows))
+
+    def list(self, request, *args, **kwargs):
+        return self.page_not_modified(request) or self.set_page_validators(
+            super().list(request, *args, **kwargs)
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        response = await sync_to_async(self.page_not_modified)(request)
+        if response is not None:
+            return response
+        response = await super().alist(request, *args, **kwargs)
+        return await sync_to_async(self.set_page_validators)(response)
+
+    def get_viewer_data(self, lookup, meta):
+        user = self.request.user
+        return {
+            "viewer_has_liked": Like.objects.filter(post_id=lookup, user_id=user.pk).exists(),
+            "viewer_follows_author": meta["author_id"] != user.pk and is_following(user.pk, meta["author_id"]),
+        }
 
     def get_serializer_class(self):
         if self.action == "list":
@@ -47,68 +189,141 @@ class PostViewSet(viewsets.ModelViewSet):
         if self.action == "retrieve":
             return PostDetailSerializer
         if self.action == "upload_image":
-            return PostImageSerializer
+            return PostImageUploadSerializer
+        if self.action == "like_batch":
+            return LikeBatchSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        serializer.save(author_id=self.request.user.pk)
 
     def get_queryset(self):
         user = self.request.user
-        user_following = user.followings.all()
         queryset = self.queryset.filter(
-            Q(author=user) | Q(author__in=user_following)
+            Q(author_id=user.pk)
+            | Exists(Follow.objects.filter(follower_id=user.pk, followee_id=OuterRef("author_id")))
         )
 
-        hashtags = self.request.query_params.get("hashtags")
-        author_email = self.request.query_params.get("author_last_name")
-        if hashtags:
-            queryset = queryset.filter(hashtags__name__icontains=hashtags)
+        hashtag = self.request.query_params.get("hashtags")
+        author_last_name = self.request.query_params.get("author_last_name")
+        if hashtag:
+            queryset = queryset.filter(hashtags__name=normalize_hashtag(hashtag))
 
-        if author_email:
-            queryset = queryset.filter(author__email__icontains=author_email)
+        if author_last_name:
+            queryset = queryset.filter(author__last_name__iexact=author_last_name)
 
-        return queryset
+        if self.action in ("list", "retrieve"):
+            queryset = queryset.with_viewer_state(user)
+        return self.plan_queryset(queryset)
 
-    @action(detail=True, methods=["POST"], url_path="like-unlike", permission_classes=[IsAuthenticated])
+    @action(
+        detail=True,
+        methods=["POST"],
+        url_path="like-unlike",
+        permission_classes=[IsAuthenticated],
+        throttle_scope="likes",
+    )
     def like(self, request, pk=None):
         post = self.get_object()
+        toggle_like(post.pk, request.user.pk)
         serializer = PostSerializer(post)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if post.likes.filter(id=request.user.id).exists():
-            post.likes.remove(request.user)
-            post.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+    @action(
+        detail=True,
+        methods=["PUT", "DELETE"],
+        url_path="like",
+        permission_classes=[IsAuthenticated],
+        throttle_scope="likes",
+    )
+    def like_state(self, request, pk=None):
+        post = self.get_object()
+        if request.method == "DELETE":
+            unlike_post(post.pk, request.user.pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
 
-        post.likes.add(request.user)
-        post.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        created = like_post(post.pk, request.user.pk)
+        return Response(
+            {"liked": True},
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="likes",
+        permission_classes=[IsAuthenticated],
+        throttle_scope="likes",
+    )
+    def like_batch(self, request):
+        """Like (``"liked": true``) or unlike up to ``BATCH_MAX_IDS`` posts at once."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        post_ids = list(dict.fromkeys(serializer.validated_data["posts"]))
+        liked = serializer.validated_data["liked"]
+        with transaction.atomic():
+            visible = set(self.get_queryset().filter(pk__in=post_ids).values_list("pk", flat=True))
+            changed = (like_posts if liked else unlike_posts)(visible, request.user.pk)
+        return Response({"results": [
+            {"post": post_id, "liked": liked, "changed": post_id in changed}
+            if post_id in visible else {"post": post_id, "error": "not_found"}
+            for post_id in post_ids
+        ]})
 
     @action(detail=True, methods=["POST"], url_path="upload-image", permission_classes=[IsAuthenticated])
     def upload_image(self, request, pk=None):
         post = self.get_object()
-        serializer = PostImageSerializer(post, data=request.data)
-
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        images = add_images(post, serializer.validated_data["images"])
+        serializer = PostImageSerializer(images, many=True, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SerializerTimingMixin, AsyncReadMixin, viewsets.ModelViewSet):
+    """Top-level comments of ``post_id``, newest first; replies are listed
+    oldest first per comment through ``replies``."""
     serializer_class = CommentSerializer
+    pagination_class = CreatedAtKeysetPagination
     queryset = Comment.objects.all()
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [StatelessJWTAuthentication]
     permission_classes = [IsAuthorOrIfAuthenticatedReadOnly]
+    async_actions = ("list", "replies")
+
+    def get_throttles(self):
+        if self.action == "create":
+            self.throttle_scope = "comments"
+        return super().get_throttles()
+
+    def get_post_id(self):
+        # posts/<pk>/comments/ names the post in the URL, Comment/ in the query string.
+        post_id = self.kwargs.get("pk") or self.request.query_params.get("post_id")
+        try:
+            return int(post_id)
+        except (TypeError, ValueError):
+            raise ValidationError({"post_id": "A post id is required."})
 
     def get_queryset(self):
         queryset = Comment.objects.all()
-        if self.action in ["retrieve", "list"]:
-            post_id = self.request.query_params.get("post_id")
-            queryset = queryset.filter(post__id=post_id)
-
-            return queryset
+        if self.action == "list":
+            return queryset.filter(post_id=self.get_post_id(), depth=0).select_related("author")
+        if self.action == "replies":
+            return queryset.filter(parent_id=self.kwargs["pk"]).select_related("author")
         return queryset
 
+    async def areplies(self, request, pk=None):
+        return await self.apaginate(self.get_queryset())
+
+    @action(detail=True, methods=["GET"], permission_classes=[IsAuthenticated],
+            pagination_class=CreatedAtAscKeysetPagination)
+    def replies(self, request, pk=None):
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
-        post_id = self.request.query_params.get("post_id")
-        serializer.save(author=self.request.user, post=Post.objects.get(id=post_id))
+        post = get_object_or_404(Post, pk=self.get_post_id())
+        parent = serializer.validated_data.get("parent")
+        if parent is not None and parent.post_id != post.pk:
+            raise ValidationError({"parent": "Replies must be on the same post as their parent."})
+        serializer.save(author_id=self.request.user.pk, post=post)
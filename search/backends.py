@@ -0,0 +1,212 @@
+"""Search backends.
+
+A backend turns a query string into a queryset of posts, users or hashtags
+annotated with a float ``rank``; the view pages through it on
+``(-rank, -id)``. ``PostgresSearchBackend`` uses the GIN full-text and
+trigram indexes. ``InMemorySearchBackend`` keeps inverted indexes in the
+process for tests and SQLite development.
+"""
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.utils.module_loading import import_string
+
+from post.models import Hashtag, Post
+
+SEARCH_CONFIG = "english"
+USER_FIELDS = ("email", "first_name", "last_name")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class BaseSearchBackend:
+    def update(self, name, pk, *texts):
+        """Called when a document changes; database indexes need no help."""
+
+    def remove(self, name, pk):
+        """Called when a document is deleted."""
+
+    def search_posts(self, query):
+        raise NotImplementedError
+
+    def search_users(self, query):
+        raise NotImplementedError
+
+    def search_hashtags(self, query):
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    def search_posts(self, query):
+        vector = SearchVector("content", config=SEARCH_CONFIG)
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return Post.objects.annotate(search=vector).filter(search=search_query).annotate(
+            rank=Cast(SearchRank(vector, search_query), FloatField()),
+        )
+
+    def search_users(self, query):
+        condition = Q()
+        for field in USER_FIELDS:
+            condition |= Q(**{f"{field}__trigram_similar": query})
+        return get_user_model().objects.filter(condition).annotate(
+            rank=Cast(
+                Greatest(*(TrigramSimilarity(field, query) for field in USER_FIELDS)),
+                FloatField(),
+            ),
+        )
+
+    def search_hashtags(self, query):
+        query = query.lstrip("#").lower()
+        return Hashtag.objects.filter(name__trigram_similar=query).annotate(
+            rank=Cast(TrigramSimilarity("name", query), FloatField()),
+        )
+
+
+def _words(text):
+    return WORD_PATTERN.findall((text or "").lower())
+
+
+def _trigrams(text):
+    text = f"  {(text or '').lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class InvertedIndex:
+    """Maps terms to the ids of the documents that contain them."""
+
+    def __init__(self, tokenize):
+        self.tokenize = tokenize
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def add(self, pk, *texts):
+        self.remove(pk)
+        terms = defaultdict(int)
+        for text in texts:
+            for term in self.tokenize(text):
+                terms[term] += 1
+        self.documents[pk] = terms
+        for term, count in terms.items():
+            self.postings[term][pk] = count
+
+    def remove(self, pk):
+        for term in self.documents.pop(pk, ()):
+            self.postings[term].pop(pk, None)
+
+    def term_frequency(self, terms):
+        scores = defaultdict(float)
+        for term in terms:
+            for pk, count in self.postings.get(term, {}).items():
+                scores[pk] += count
+        return scores
+
+    def similarity(self, terms, threshold):
+        """Jaccard similarity of each document's term set with ``terms``."""
+        overlap = self.term_frequency(terms)
+        scores = {}
+        for pk, shared in overlap.items():
+            score = shared / (len(terms) + len(self.documents[pk]) - shared)
+            if score >= threshold:
+                scores[pk] = score
+        return scores
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    similarity_threshold = 0.3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = None
+
+    def _build(self):
+        indexes = {
+            "posts": InvertedIndex(_words),
+            "users": InvertedIndex(_trigrams),
+            "hashtags": InvertedIndex(_trigrams),
+        }
+        for pk, content in Post.objects.values_list("pk", "content").iterator():
+            indexes["posts"].add(pk, content)
+        for pk, *fields in get_user_model().objects.values_list("pk", *USER_FIELDS).iterator():
+            self._add_user(indexes["users"], pk, fields)
+        for pk, name in Hashtag.objects.values_list("pk", "name").iterator():
+            indexes["hashtags"].add(pk, name)
+        return indexes
+
+    @staticmethod
+    def _add_user(index, pk, fields):
+        """Index each user field separately so similarity is per field."""
+        for position, text in enumerate(fields):
+            index.remove((pk, position))
+            if text:
+                index.add((pk, position), text)
+
+    def _index(self, name):
+        with self._lock:
+            if self._indexes is None:
+                self._indexes = self._build()
+            return self._indexes[name]
+
+    def update(self, name, pk, *texts):
+        with self._lock:
+            if self._indexes is None:
+                return
+            if name == "users":
+                self._add_user(self._indexes[name], pk, texts)
+            else:
+                self._indexes[name].add(pk, *texts)
+
+    def remove(self, name, pk):
+        with self._lock:
+            if self._indexes is None:
+                return
+            if name == "users":
+                self._add_user(self._indexes[name], pk, [None] * len(USER_FIELDS))
+            else:
+                self._indexes[name].remove(pk)
+
+    def reset(self):
+        with self._lock:
+            self._indexes = None
+
+    @staticmethod
+    def _ranked(queryset, scores):
+        if not scores:
+            return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+        return queryset.filter(pk__in=scores).annotate(
+            rank=Case(
+                *(When(pk=pk, then=Value(score)) for pk, score in scores.items()),
+                output_field=FloatField(),
+            ),
+        )
+
+    def search_posts(self, query):
+        index = self._index("posts")
+        scores = index.term_frequency(set(_words(query)))
+        return self._ranked(Post.objects.all(), scores)
+
+    def search_users(self, query):
+        index = self._index("users")
+        scores = {}
+        for (pk, _), score in index.similarity(_trigrams(query), self.similarity_threshold).items():
+            scores[pk] = max(score, scores.get(pk, 0.0))
+        return self._ranked(get_user_model().objects.all(), scores)
+
+    def search_hashtags(self, query):
+        index = self._index("hashtags")
+        scores = index.similarity(_trigrams(query.lstrip("#")), self.similarity_threshold)
+        return self._ranked(Hashtag.objects.all(), scores)
+
+
+_backends = {}
+
+
+def get_search_backend():
+    path = settings.SEARCH_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
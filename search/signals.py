@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from post.hashtags import hashtags_resolved
+from post.models import Hashtag, Post
+from .backends import USER_FIELDS, get_search_backend
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    get_search_backend().update("posts", instance.pk, instance.content)
+
+
+@receiver(post_save, sender=get_user_model())
+def index_user(sender, instance, **kwargs):
+    fields = (getattr(instance, field) for field in USER_FIELDS)
+    get_search_backend().update("users", instance.pk, *fields)
+
+
+@receiver(post_save, sender=Hashtag)
+def index_hashtag(sender, instance, **kwargs):
+    get_search_backend().update("hashtags", instance.pk, instance.name)
+
+
+@receiver(hashtags_resolved)
+def index_hashtags(sender, hashtags, **kwargs):
+    backend = get_search_backend()
+    for pk, name in hashtags.items():
+        backend.update("hashtags", pk, name)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_delete, sender=Hashtag)
+def unindex(sender, instance, **kwargs):
+    name = {Post: "posts", Hashtag: "hashtags"}.get(sender, "users")
+    get_search_backend().remove(name, instance.pk)
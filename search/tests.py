@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from post.hashtags import attach_hashtags, extract_hashtags
+from post.models import Hashtag, Post
+from .backends import get_search_backend
+
+IN_MEMORY = "search.backends.InMemorySearchBackend"
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.author = get_user_model().objects.create_user(
+            email="author@email.com", password="testpass", first_name="Margaret", last_name="Hamilton"
+        )
+        self.user.followings.add(self.author)
+
+    def search(self, **params):
+        return self.client.get(reverse("search:search"), params)
+
+    def test_post_search_ranks_and_filters_by_followings(self):
+        stranger = get_user_model().objects.create_user(email="stranger@email.com", password="testpass")
+        once = Post.objects.create(author=self.author, content="coffee in the morning")
+        twice = Post.objects.create(author=self.author, content="coffee, more coffee")
+        Post.objects.create(author=stranger, content="coffee everywhere")
+        Post.objects.create(author=self.author, content="tea time")
+
+        response = self.search(q="coffee")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [twice.id, once.id])
+
+    def test_post_search_pages_by_rank(self):
+        posts = [Post.objects.create(author=self.author, content="coffee") for _ in range(3)]
+
+        first = self.search(q="coffee", page_size=2)
+        second = self.client.get(first.data["next"])
+        ids = [item["id"] for item in first.data["results"] + second.data["results"]]
+        self.assertEqual(ids, [post.id for post in reversed(posts)])
+        self.assertIsNone(second.data["next"])
+
+    def test_query_and_type_are_validated(self):
+        self.assertEqual(self.search().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search(q="x", type="comments").status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(SEARCH_BACKEND=IN_MEMORY)
+class InMemorySearchTests(SearchTests):
+    def setUp(self):
+        get_search_backend().reset()
+        super().setUp()
+
+    def test_user_search_tolerates_typos(self):
+        response = self.search(q="hamiltn", type="users")
+        self.assertEqual([item["id"] for item in response.data["results"]], [self.author.id])
+
+    def test_hashtag_search(self):
+        hashtag = Hashtag.objects.create(name="django")
+        Hashtag.objects.create(name="flask")
+
+        response = self.search(q="#djang", type="hashtags")
+        self.assertEqual([item["id"] for item in response.data["results"]], [hashtag.id])
+
+    def test_hashtags_created_with_a_post_are_indexed(self):
+        self.assertEqual(self.search(q="#django", type="hashtags").data["results"], [])
+        post = Post.objects.create(author=self.author, content="hello #Django")
+        attach_hashtags(post, extract_hashtags(post.content))
+
+        response = self.search(q="#django", type="hashtags")
+        self.assertEqual(
+            [item["id"] for item in response.data["results"]], [Hashtag.objects.get(name="django").id]
+        )
+
+    def test_index_follows_writes(self):
+        post = Post.objects.create(author=self.author, content="coffee")
+        self.assertEqual(len(self.search(q="coffee").data["results"]), 1)
+
+        post.content = "tea"
+        post.save()
+        self.assertEqual(len(self.search(q="coffee").data["results"]), 0)
+        post.delete()
+        self.assertEqual(len(self.search(q="tea").data["results"]), 0)
@@ -0,0 +1,59 @@
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+
+from post.serializers import HashtagListSerializer, PostListSerializer
+from post.views import POST_LIST_PLAN
+from social_media.metrics import SerializerTimingMixin
+from social_media.pagination import KeysetPagination
+from user.authentication import StatelessJWTAuthentication
+from user.follows import following_ids
+from user.serializers import UserListSerializer
+from .backends import get_search_backend
+
+SEARCH_TYPES = {
+    "posts": PostListSerializer,
+    "users": UserListSerializer,
+    "hashtags": HashtagListSerializer,
+}
+
+
+class RankedKeysetPagination(KeysetPagination):
+    ordering = ("-rank", "-id")
+
+
+class SearchView(SerializerTimingMixin, generics.ListAPIView):
+    """Search posts, users or hashtags: ``?q=<query>&type=posts|users|hashtags``.
+
+    Results are ordered by relevance; posts are limited to the user's own
+    and the ones of followed authors.
+    """
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = RankedKeysetPagination
+
+    def get_search_type(self):
+        search_type = self.request.query_params.get("type", "posts")
+        if search_type not in SEARCH_TYPES:
+            raise ValidationError({"type": f"Must be one of: {', '.join(SEARCH_TYPES)}."})
+        return search_type
+
+    def get_serializer_class(self):
+        return SEARCH_TYPES[self.get_search_type()]
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        backend = get_search_backend()
+        search_type = self.get_search_type()
+        if search_type == "posts":
+            user = self.request.user
+            queryset = backend.search_posts(query).filter(
+                author_id__in=[user.pk, *following_ids(user.pk)]
+            )
+            return POST_LIST_PLAN.apply(queryset.with_viewer_state(user))
+        if search_type == "users":
+            return backend.search_users(query).with_counts()
+        return backend.search_hashtags(query).with_counts()
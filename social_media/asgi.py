@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media.settings')
 
 application = get_asgi_application()
+
+from social_media.db import install_connection_health_checks  # noqa: E402
+
+install_connection_health_checks()
@@ -0,0 +1,161 @@
+"""Async handlers for the hot read paths.
+
+Django 4.0 has no async ORM and DRF calls handlers synchronously, so
+``AsyncReadMixin`` gives a viewset an async entry point for the GET actions
+named in ``async_actions``: authentication, permissions and throttles run in
+a thread, then an ``a<action>`` coroutine awaits its queries. Served over
+ASGI, a request waiting on Postgres then holds no worker thread.
+
+``aevaluate`` runs the page query and then all prefetches of the queryset
+at once, each on its own connection from a pool of ``ASYNC_QUERY_WORKERS``
+threads. Inside a transaction (tests, ``ATOMIC_REQUESTS``) other
+connections cannot see its rows, so there they run one after another on the
+request's connection instead.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import update_wrapper
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Prefetch, prefetch_related_objects
+from django.db.models.constants import LOOKUP_SEP
+from django.http import Http404
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_QUERY_WORKERS,
+            thread_name_prefix="async-query",
+        )
+    return _executor
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+async def run_queries(*calls):
+    """Run ``(func, *args)`` calls that block on the database concurrently.
+
+    Returns their results in order.
+    """
+    if await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)(*args) for func, *args in calls]
+    loop = asyncio.get_running_loop()
+    # A copy of the context per call keeps the request's metrics attached.
+    return await asyncio.gather(*(
+        loop.run_in_executor(_get_executor(), contextvars.copy_context().run, _run, func, args)
+        for func, *args in calls
+    ))
+
+
+def _prefetch_groups(lookups):
+    """Lookups through the same first relation fill the same objects, so
+    they stay together and run in order."""
+    groups = {}
+    for lookup in lookups:
+        through = lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup
+        groups.setdefault(through.split(LOOKUP_SEP)[0], []).append(lookup)
+    return list(groups.values())
+
+
+async def aevaluate(queryset):
+    """``list(queryset)`` with its prefetch lookups issued concurrently."""
+    lookups = queryset._prefetch_related_lookups
+    (rows,) = await run_queries((list, queryset.prefetch_related(None)))
+    if rows and lookups:
+        # Created up front so concurrent prefetches never race to create it.
+        for row in rows:
+            row._prefetched_objects_cache = {}
+        await run_queries(*(
+            (prefetch_related_objects, rows, *group) for group in _prefetch_groups(lookups)
+        ))
+    return rows
+
+
+class AsyncReadMixin:
+    """Serve the GET actions in ``async_actions`` from ``a<action>`` coroutines.
+
+    Must come before the DRF viewset class. Other methods of the same route
+    still go through the synchronous ``dispatch``.
+    """
+    async_actions = ("list", "retrieve")
+    is_async = False
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if actions.get("get") not in cls.async_actions:
+            return view
+
+        async def async_view(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await sync_to_async(view)(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = {"head": actions["get"], **actions}
+            for method, name in self.action_map.items():
+                setattr(self, method, getattr(self, name))
+            self.request = request
+            return await self.async_dispatch(request, *args, **kwargs)
+
+        return update_wrapper(async_view, view)
+
+    async def async_dispatch(self, request, *args, **kwargs):
+        """``APIView.dispatch`` awaiting the ``a<action>`` handler."""
+        self.is_async = True
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            response = await getattr(self, f"a{self.action}")(request, *args, **kwargs)
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def apaginate(self, queryset):
+        """A keyset page of ``queryset``, serialized without further queries."""
+        paginator = self.paginator
+        # Building the page queryset may query too, e.g. for the feed's pull authors.
+        page_queryset = await sync_to_async(paginator.get_page_queryset)(queryset, self.request, view=self)
+        page = paginator.set_page(await aevaluate(page_queryset))
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.get_queryset)()
+        return await self.apaginate(self.filter_queryset(queryset))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        # The response cache is synchronous; a miss builds through get_object.
+        return await sync_to_async(self.retrieve)(request, *args, **kwargs)
+
+    def get_object(self):
+        if not self.is_async:
+            return super().get_object()
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        rows = async_to_sync(aevaluate)(queryset[:1])
+        if not rows:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(self.request, rows[0])
+        return rows[0]
@@ -0,0 +1,41 @@
+"""Conditional GET: ``ETag``/``Last-Modified`` validators and 304 responses.
+
+Validators are built from what is known before a payload is serialized:
+the content hash stored with a response cache entry, and the response
+cache versions (``post:1``, ``user:7`` ...) that signal handlers bump on
+every write a payload depends on. Payloads differ per user, so every
+validator also covers the requesting user, and responses are marked
+``Cache-Control: private, no-cache`` so clients revalidate each time.
+"""
+import hashlib
+import json
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def content_hash(*parts):
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def make_etag(*parts):
+    return quote_etag(content_hash(*parts))
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 (or 412) ``Response`` if the client's copy is current, else ``None``."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        return None
+    return set_validators(Response(status=response.status_code), etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Authorization",))
+    return response
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import F, IntegerField, Subquery, Window
+from django.db.models.functions import RowNumber
+
+
+class SubqueryCount(Subquery):
+    """Correlated ``COUNT(*)`` over ``queryset`` to annotate list pages.
+
+    Unlike ``Count()`` it needs no GROUP BY over the outer query and is only
+    evaluated for the rows that make it into the page.
+    """
+    template = "(SELECT COUNT(*) FROM (%(subquery)s) _count)"
+    output_field = IntegerField()
+
+    def __init__(self, queryset, **extra):
+        super().__init__(queryset.order_by().values("pk"), **extra)
+
+
+class TopPerGroup(Subquery):
+    """Primary keys of the first ``limit`` rows of ``queryset`` per ``partition_by`` value.
+
+    Meant for ``pk__in`` filters. Rows are ranked with ``ROW_NUMBER()`` in
+    one query; Django 4.0 cannot filter on a window function directly.
+    """
+    template = "(SELECT _top.%(pk)s FROM (%(subquery)s) _top WHERE _top.row_number <= %(limit)d)"
+
+    def __init__(self, queryset, partition_by, order_by, limit, **extra):
+        ordering = [F(name[1:]).desc() if name.startswith("-") else F(name).asc() for name in order_by]
+        queryset = queryset.order_by().annotate(
+            row_number=Window(RowNumber(), partition_by=F(partition_by), order_by=ordering),
+        ).values("pk", "row_number")
+        super().__init__(queryset, output_field=queryset.model._meta.pk, limit=limit, **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        pk = connection.ops.quote_name(self.query.model._meta.pk.column)
+        return super().as_sql(compiler, connection, pk=pk, **extra_context)
+
+
+def check_persistent_connections(**kwargs):
+    """Drop reused connections the server has closed before a request uses them."""
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+def install_connection_health_checks():
+    if settings.DB_CONN_HEALTH_CHECKS:
+        request_started.connect(check_persistent_connections, dispatch_uid="db-health-checks")
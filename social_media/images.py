@@ -0,0 +1,180 @@
+"""Background processing for uploaded images.
+
+An upload is hashed and written once to the model's ``incoming`` folder, and
+the model is marked ``pending``. A background task then re-encodes it without
+EXIF metadata into the WebP renditions of ``IMAGE_RENDITIONS``, stored under
+``uploads/<folder>/<sha256>/``. Identical uploads share those files, and an
+upload whose renditions already exist is ready without any processing.
+"""
+import hashlib
+import logging
+import os
+from base64 import b64encode
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from .response_cache import response_cache
+from .tasks import enqueue
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ("width", "height", "placeholder")
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 30
+
+
+class ImageStatus(models.TextChoices):
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+
+
+def content_hash(upload):
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def rendition_names(model, digest):
+    folder_name = getattr(model, "upload_folder", f"{model._meta.model_name}s")
+    folder = os.path.join("uploads", folder_name, digest)
+    return {name: os.path.join(folder, f"{name}.webp") for name in settings.IMAGE_RENDITIONS}
+
+
+def primary_rendition():
+    """The largest rendition; the image field itself points at it."""
+    return max(settings.IMAGE_RENDITIONS, key=settings.IMAGE_RENDITIONS.get)
+
+
+def render(source):
+    """Return ``{name: webp_bytes}``; EXIF is dropped by re-encoding."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        renditions = {}
+        for name, size in settings.IMAGE_RENDITIONS.items():
+            resized = image.copy()
+            resized.thumbnail((size, size))
+            buffer = BytesIO()
+            resized.save(buffer, "WEBP", quality=settings.IMAGE_WEBP_QUALITY)
+            renditions[name] = buffer.getvalue()
+    return renditions
+
+
+def metadata(model, names):
+    """Values for the model's ``width``/``height``/``placeholder`` fields.
+
+    Read from the stored renditions: the size of the primary one, and the
+    smallest one shrunk to an inline data URI that clients can show blurred
+    while the real image loads.
+    """
+    wanted = {field.name for field in model._meta.concrete_fields} & set(METADATA_FIELDS)
+    if not wanted:
+        return {}
+    with default_storage.open(names[primary_rendition()]) as stored, Image.open(stored) as image:
+        values = {"width": image.width, "height": image.height}
+    smallest = min(settings.IMAGE_RENDITIONS, key=settings.IMAGE_RENDITIONS.get)
+    with default_storage.open(names[smallest]) as stored, Image.open(stored) as image:
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+        buffer = BytesIO()
+        image.save(buffer, "WEBP", quality=PLACEHOLDER_QUALITY)
+    values["placeholder"] = f"data:image/webp;base64,{b64encode(buffer.getvalue()).decode()}"
+    return {key: value for key, value in values.items() if key in wanted}
+
+
+def stage_upload(instance, field_name, upload):
+    """Attach ``upload`` to ``instance.<field_name>`` without saving it.
+
+    Returns the content hash when the renditions still have to be made,
+    ``None`` when an identical upload already produced them.
+    """
+    digest = content_hash(upload)
+    names = rendition_names(type(instance), digest)
+    field_file = getattr(instance, field_name)
+
+    if all(default_storage.exists(name) for name in names.values()):
+        field_file.name = names[primary_rendition()]
+        setattr(instance, f"{field_name}_status", ImageStatus.READY)
+        setattr(instance, f"{field_name}_renditions", names)
+        for key, value in metadata(type(instance), names).items():
+            setattr(instance, key, value)
+        return None
+
+    _, extension = os.path.splitext(upload.name)
+    field_file.save(f"{digest}{extension.lower()}", upload, save=False)
+    setattr(instance, f"{field_name}_status", ImageStatus.PENDING)
+    setattr(instance, f"{field_name}_renditions", {})
+    return digest
+
+
+def queue_processing(instance, field_name, digest, version=None):
+    """Process a staged upload once the current transaction commits.
+
+    ``version`` is the response cache version to bump when it is done.
+    """
+    version = version or f"{instance._meta.model_name}:{instance.pk}"
+    staged_name = getattr(instance, field_name).name
+    enqueue(process_image, instance._meta.label, instance.pk, field_name, digest, staged_name, version)
+
+
+def accept_upload(instance, field_name, upload):
+    """Stage ``upload`` as ``instance.<field_name>`` and queue its processing.
+
+    Returns the new status; the request never waits for Pillow.
+    """
+    digest = stage_upload(instance, field_name, upload)
+    instance.save(update_fields=[field_name, f"{field_name}_status", f"{field_name}_renditions"])
+    if digest:
+        queue_processing(instance, field_name, digest)
+    return getattr(instance, f"{field_name}_status")
+
+
+def process_image(model_label, pk, field_name, digest, staged_name, version):
+    model = apps.get_model(model_label)
+    names = rendition_names(model, digest)
+    try:
+        missing = [name for name, path in names.items() if not default_storage.exists(path)]
+        if missing:
+            with default_storage.open(staged_name) as staged:
+                rendered = render(staged)
+            for name in missing:
+                names[name] = default_storage.save(names[name], ContentFile(rendered[name]))
+        changes = {
+            field_name: names[primary_rendition()],
+            f"{field_name}_status": ImageStatus.READY,
+            f"{field_name}_renditions": names,
+            **metadata(model, names),
+        }
+    except Exception:
+        # Malformed files get past DRF's verify() and fail in Pillow with
+        # OSError, ValueError, SyntaxError, struct.error and more.
+        logger.exception("Processing %s %s image %s failed", model_label, pk, staged_name)
+        changes = {field_name: "", f"{field_name}_status": ImageStatus.FAILED}
+
+    # A newer upload replaces the staged name; then this result is dropped.
+    updated = model.objects.filter(pk=pk, **{field_name: staged_name}).update(**changes)
+    default_storage.delete(staged_name)
+    if updated:
+        response_cache.bump(version)
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """``{"thumbnail": url, ...}`` once the image is processed."""
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        urls = {}
+        for name, path in (value or {}).items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
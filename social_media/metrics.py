@@ -0,0 +1,318 @@
+"""Per-request performance metrics in Prometheus format.
+
+``MetricsMiddleware`` records, for each view and action (``PostViewSet.like``),
+the wall time, number and time of database queries, time spent building
+``serializer.data`` in views with ``SerializerTimingMixin`` and response
+size. Values go into log-linear histograms in the style of HdrHistogram:
+recording is one integer bucket increment, and quantiles are exact to within
+``1 / 2 ** (SUB_BUCKET_BITS - 1)``, as each power of two above
+``SUB_BUCKETS`` keeps ``HALF_SUB_BUCKETS`` buckets. ``/metrics`` exposes
+them as summaries, together with the response cache counters, to scrapers
+that send ``METRICS_TOKEN``; without a token it is closed.
+
+Queries are attributed through a context variable, so the ones an async view
+runs on its query threads count towards its request as well. Requests slower
+than ``METRICS_SLOW_REQUEST_MS`` are logged with their queries, for a
+``METRICS_SLOW_REQUEST_SAMPLE_RATE`` share of them.
+
+Every process keeps its own numbers; with several gunicorn workers each
+scrape sees the worker that answered it.
+"""
+import asyncio
+import contextvars
+import hmac
+import logging
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+MAX_LOGGED_QUERIES = 200
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS
+
+
+def bucket_upper_bound(index):
+    if index < SUB_BUCKETS:
+        return index
+    shift, offset = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+    return ((offset + HALF_SUB_BUCKETS + 1) << (shift + 1)) - 1
+
+
+class Histogram:
+    """Counts of non-negative values, stored as integers of ``1 / scale``."""
+
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.counts = []
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        value = max(0, int(value * self.scale))
+        index = bucket_index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, quantile):
+        """Highest value of the bucket holding the ``quantile`` quantile."""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(quantile * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max) / self.scale
+        return self.max / self.scale
+
+
+# name -> (help, scale of the recorded unit)
+SUMMARIES = {
+    "http_request_duration_seconds": ("Wall time of requests by view.", 1_000_000),
+    "http_request_db_queries": ("Database queries per request by view.", 1),
+    "http_request_db_duration_seconds": ("Time in database queries per request by view.", 1_000_000),
+    "http_request_serializer_duration_seconds": ("Time building serializer data per request by view.", 1_000_000),
+    "http_response_size_bytes": ("Response body size by view.", 1),
+}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.summaries = {
+                name: defaultdict(lambda scale=scale: Histogram(scale))
+                for name, (_, scale) in SUMMARIES.items()
+            }
+
+    def observe(self, view, status, values):
+        with self._lock:
+            self.requests[view, status] += 1
+            for name, value in values.items():
+                if value is not None:
+                    self.summaries[name][view].record(value)
+
+    def render(self):
+        lines = [
+            "# HELP http_requests_total Requests by view and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            for (view, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{view="{_escape(view)}",status="{status}"}} {count}')
+            for name, (help_text, _) in SUMMARIES.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+                for view, histogram in sorted(self.summaries[name].items()):
+                    label = f'view="{_escape(view)}"'
+                    for quantile in QUANTILES:
+                        lines.append(f'{name}{{{label},quantile="{quantile}"}} {histogram.quantile(quantile):g}')
+                    lines.append(f"{name}_sum{{{label}}} {histogram.sum / histogram.scale:g}")
+                    lines.append(f"{name}_count{{{label}}} {histogram.count}")
+        lines += [
+            "# HELP response_cache_events_total Response cache lookups and rebuilds by outcome.",
+            "# TYPE response_cache_events_total counter",
+        ]
+        for event, count in sorted(response_cache.stats().items()):
+            lines.append(f'response_cache_events_total{{event="{_escape(event)}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """What one request spent; filled from any thread that runs its work."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = []
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def add_query(self, sql, duration):
+        with self._lock:
+            self.query_count += 1
+            self.db_time += duration
+            if len(self.queries) < MAX_LOGGED_QUERIES:
+                self.queries.append((sql, duration))
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_wrapper(sender=None, connection=connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+class TimedDataMixin:
+    """Adds the time spent building ``.data`` to the current request."""
+
+    @property
+    def data(self):
+        metrics = current_request.get()
+        if metrics is None:
+            return super().data
+        # A serializer may read another's .data inside its own; count it once.
+        metrics.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - started
+
+
+_timed_classes = {}
+_timed_classes_lock = threading.Lock()
+
+
+def timed_serializer_class(serializer_class):
+    with _timed_classes_lock:
+        if serializer_class not in _timed_classes:
+            _timed_classes[serializer_class] = type(
+                serializer_class.__name__,
+                (TimedDataMixin, serializer_class),
+                {"__module__": serializer_class.__module__},
+            )
+        return _timed_classes[serializer_class]
+
+
+class SerializerTimingMixin:
+    """Times the serializers a view builds with ``get_serializer``.
+
+    With ``many=True`` this is the list serializer, so a page is timed once
+    rather than per item.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.__class__ = timed_serializer_class(type(serializer))
+        return serializer
+
+
+def view_name(request):
+    """``ViewClass.action`` for DRF views, the URL name for the rest."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    view_class = getattr(match.func, "cls", None)
+    if view_class is None:
+        return match.view_name
+    method = request.method.lower()
+    actions = getattr(match.func, "actions", None) or {}
+    return f"{view_class.__name__}.{actions.get(method, method)}"
+
+
+class MetricsMiddleware:
+    """Records each request into ``registry``. Must come first in ``MIDDLEWARE``."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        connection_created.connect(install_query_wrapper, dispatch_uid="social_media.metrics")
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        install_query_wrapper()
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.observe(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, metrics, duration):
+        view = view_name(request)
+        registry.observe(view, response.status_code, {
+            "http_request_duration_seconds": duration,
+            "http_request_db_queries": metrics.query_count,
+            "http_request_db_duration_seconds": metrics.db_time,
+            "http_request_serializer_duration_seconds": metrics.serializer_time,
+            "http_response_size_bytes": None if response.streaming else len(response.content),
+        })
+        if (
+            duration * 1000 >= settings.METRICS_SLOW_REQUEST_MS
+            and random.random() < settings.METRICS_SLOW_REQUEST_SAMPLE_RATE
+        ):
+            logger.warning(
+                "Slow request %s %s (%s) took %.0f ms, %d queries in %.0f ms:\n%s",
+                request.method,
+                request.path,
+                view,
+                duration * 1000,
+                metrics.query_count,
+                metrics.db_time * 1000,
+                "\n".join(f"{seconds * 1000:8.1f} ms  {sql}" for sql, seconds in metrics.queries),
+            )
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
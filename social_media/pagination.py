@@ -0,0 +1,141 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only cursor pagination that seeks on ``ordering``.
+
+    The cursor holds the ordering values of the last row of the page, so
+    the next page is a ``WHERE (a, b) < (x, y) ... LIMIT n`` index range
+    scan and costs the same at any depth. ``ordering`` must end with a
+    unique column.
+    """
+    ordering = ("id",)
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request, view)))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The unevaluated page, with one extra row to tell if there is a next one."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size,
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_position_filter(self, position):
+        """Expand the row comparison into ``a < x OR (a = x AND b < y) ...``.
+
+        The leading column also gets a plain range bound so the planner can
+        start the index scan at the cursor.
+        """
+        fields = [(order.lstrip("-"), "lt" if order.startswith("-") else "gt") for order in self.ordering]
+        first_field, first_lookup = fields[0]
+        condition = Q()
+        equal = Q()
+        for (field, lookup), value in zip(fields, position):
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return Q(**{f"{first_field}__{first_lookup}e": position[0]}) & condition
+
+    def encode_cursor(self, instance):
+        values = []
+        for order in self.ordering:
+            value = getattr(instance, order.lstrip("-"))
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        encoded = b64encode(json.dumps(values).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            values = json.loads(b64decode(encoded.encode(), validate=True))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self._to_python(model, order.lstrip("-"), value)
+                for order, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _to_python(model, field_name, value):
+        try:
+            return model._meta.get_field(field_name).to_python(value)
+        except FieldDoesNotExist:
+            return value
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class CreatedAtAscKeysetPagination(KeysetPagination):
+    ordering = ("created_at", "id")
+
+
+class LikedAtKeysetPagination(KeysetPagination):
+    """Posts annotated with ``liked_at``/``like_id``, newest like first."""
+    ordering = ("-liked_at", "-like_id")
+
+
+class FollowedAtKeysetPagination(KeysetPagination):
+    """Users annotated with ``followed_at``/``follow_id``, newest follow first."""
+    ordering = ("-followed_at", "-follow_id")
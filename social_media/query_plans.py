@@ -0,0 +1,32 @@
+class QueryPlan:
+    """Eager-loading plan for one viewset action.
+
+    ``annotate`` names queryset methods (e.g. ``with_counts``) to call on
+    top of the ``select_related``/``prefetch_related`` lookups.
+    """
+
+    def __init__(self, select_related=(), prefetch_related=(), annotate=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.annotate = tuple(annotate)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        for method in self.annotate:
+            queryset = getattr(queryset, method)()
+        return queryset
+
+
+class QueryPlanMixin:
+    """Apply ``query_plans[self.action]`` to querysets built by the viewset."""
+
+    query_plans = {}
+
+    def plan_queryset(self, queryset, action=None):
+        plan = self.query_plans.get(action or self.action)
+        if plan is None:
+            return queryset
+        return plan.apply(queryset)
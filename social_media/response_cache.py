@@ -0,0 +1,195 @@
+"""Versioned cache for serialized detail responses.
+
+Entries are stored in the ``RESPONSE_CACHE_ALIAS`` cache together with the
+versions of everything they were built from (``post:1``, ``user:7`` ...).
+Signal handlers bump those versions on writes, so a stale entry is never
+served after an invalidation even though nothing is deleted. Entries stay
+fresh for ``RESPONSE_CACHE_TIMEOUT`` seconds; after that one request
+rebuilds them while the others keep getting the previous copy for up to
+``RESPONSE_CACHE_GRACE`` seconds, so a hot key never stampedes the database.
+Each entry keeps a hash of its data, so detail responses carry an ``ETag``
+and answer ``If-None-Match`` with a 304 without touching the payload.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .conditional import content_hash, make_etag, not_modified, set_validators
+
+VERSION_KEY = "rc:version:{}"
+ENTRY_KEY = "rc:entry:{}"
+LOCK_KEY = "rc:lock:{}"
+LOCK_POLL_INTERVAL = 0.05
+
+
+class ResponseCache:
+    def __init__(self):
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[settings.RESPONSE_CACHE_ALIAS]
+
+    def record(self, event):
+        with self._stats_lock:
+            self._stats[event] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats.clear()
+
+    def get_versions(self, names):
+        """Current version of each dependency, creating missing ones.
+
+        New versions start from a timestamp so an evicted version key can
+        never come back with a value an old entry was stamped with.
+        """
+        keys = {VERSION_KEY.format(name): name for name in names}
+        versions = self.cache.get_many(keys)
+        for key in keys.keys() - versions.keys():
+            self.cache.add(key, time.time_ns(), None)
+            versions[key] = self.cache.get(key)
+        return {keys[key]: version for key, version in versions.items()}
+
+    def bump(self, *names):
+        for name in names:
+            key = VERSION_KEY.format(name)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, time.time_ns(), None)
+
+    def _is_current(self, entry):
+        return self.get_versions(entry["versions"]) == entry["versions"]
+
+    def _build(self, name, builder):
+        # Versions are read before the data is serialized and checked again
+        # after: an entry whose dependencies moved during the build is
+        # returned to this request but never stored as current.
+        versions = self.get_versions([name])
+        dependencies, meta, serialize = builder()
+        versions.update(self.get_versions(set(dependencies) - {name}))
+        data = serialize()
+        now = time.time()
+        entry = {
+            "data": data,
+            "meta": meta,
+            "versions": versions,
+            "etag": content_hash(data),
+            "built_at": now,
+            "fresh_until": now + settings.RESPONSE_CACHE_TIMEOUT,
+        }
+        if not self._is_current(entry):
+            self.record("discarded_builds")
+            return entry
+        self.cache.set(
+            ENTRY_KEY.format(name),
+            entry,
+            settings.RESPONSE_CACHE_TIMEOUT + settings.RESPONSE_CACHE_GRACE,
+        )
+        return entry
+
+    def get_or_build(self, name, builder):
+        """Return the cached entry for ``name`` or build it.
+
+        ``builder`` loads the object and returns ``(dependencies, meta,
+        serialize)``: ``dependencies`` are the version names the data is
+        built from and ``serialize()`` returns the data itself, called once
+        their versions have been read.
+        """
+        entry = self.cache.get(ENTRY_KEY.format(name))
+        if entry is not None and self._is_current(entry):
+            if entry["fresh_until"] > time.time():
+                self.record("hits")
+                return entry
+            if not self.cache.add(LOCK_KEY.format(name), 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+                self.record("stale_hits")
+                return entry
+            return self._rebuild(name, builder)
+
+        self.record("misses")
+        if self.cache.add(LOCK_KEY.format(name), 1, settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+            return self._rebuild(name, builder)
+
+        deadline = time.time() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+        while time.time() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = self.cache.get(ENTRY_KEY.format(name))
+            if entry is not None and self._is_current(entry):
+                self.record("lock_waits")
+                return entry
+        return self._rebuild(name, builder)
+
+    def _rebuild(self, name, builder):
+        self.record("builds")
+        try:
+            return self._build(name, builder)
+        finally:
+            self.cache.delete(LOCK_KEY.format(name))
+
+
+response_cache = ResponseCache()
+
+
+class CachedRetrieveMixin:
+    """Serve ``retrieve`` from the response cache.
+
+    Subclasses set ``cache_namespace`` and may extend
+    ``get_cache_dependencies``/``get_cache_meta``; ``has_cached_access``
+    decides whether a cached copy may be shown to the current user without
+    running ``get_object``. Fields named in ``viewer_fields`` depend on who
+    asks: they are left out of the cached copy and filled in per request by
+    ``get_viewer_data``.
+
+    The ``ETag`` covers the cached data, the user and their viewer fields;
+    ``Last-Modified`` is when the entry was built, since nothing it depends
+    on has changed after that.
+    """
+    cache_namespace = None
+    viewer_fields = ()
+
+    def get_cache_dependencies(self, instance):
+        return [f"{self.cache_namespace}:{instance.pk}"]
+
+    def get_cache_meta(self, instance):
+        return {}
+
+    def has_cached_access(self, meta):
+        return self.request.user.is_authenticated
+
+    def get_viewer_data(self, lookup, meta):
+        return {}
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        viewer_data = None
+
+        def build():
+            instance = self.get_object()
+
+            def serialize():
+                nonlocal viewer_data
+                data = self.get_serializer(instance).data
+                viewer_data = {name: data.pop(name) for name in self.viewer_fields}
+                return data
+
+            return self.get_cache_dependencies(instance), self.get_cache_meta(instance), serialize
+
+        entry = response_cache.get_or_build(f"{self.cache_namespace}:{lookup}", build)
+        if viewer_data is None:
+            if not self.has_cached_access(entry["meta"]):
+                return super().retrieve(request, *args, **kwargs)
+            viewer_data = self.get_viewer_data(lookup, entry["meta"])
+        etag = make_etag(entry["etag"], request.user.pk, viewer_data)
+        last_modified = int(entry["built_at"])
+        response = not_modified(request, etag, last_modified) or Response({**entry["data"], **viewer_data})
+        return set_validators(response, etag, last_modified)
@@ -26,10 +26,14 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ["SECRET_KEY"]
 
+# "production" serves through gunicorn behind nginx; see gunicorn.conf.py.
+SERVING_PROFILE = os.environ.get("SERVING_PROFILE", "development")
+PRODUCTION = SERVING_PROFILE == "production"
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get("DEBUG", "0" if PRODUCTION else "1") == "1"
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get("ALLOWED_HOSTS", "").split(",") if host]
 
 
 # Application definition
@@ -41,15 +45,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "rest_framework",
     "rest_framework_simplejwt",
     "rest_framework_simplejwt.token_blacklist",
     "drf_spectacular",
     'user',
-    'post'
+    'post',
+    'search',
+    'notifications',
 ]
 
 MIDDLEWARE = [
+    "social_media.metrics.MetricsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,6 +67,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if PRODUCTION:
+    MIDDLEWARE.insert(2, "django.middleware.gzip.GZipMiddleware")
+    SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+
+# Debug-only apps are imported only when asked for.
+if DEBUG and os.environ.get("DEBUG_TOOLBAR") == "1":
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(1, "debug_toolbar.middleware.DebugToolbarMiddleware")
+    INTERNAL_IPS = ["127.0.0.1"]
+
 ROOT_URLCONF = 'social_media.urls'
 
 TEMPLATES = [
@@ -92,9 +110,33 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
         "HOST": os.environ.get("POSTGRES_HOST"),
         "PORT": os.environ.get("POSTGRES_PORT"),
+        # Keep connections open between requests; 0 closes them per request.
+        "CONN_MAX_AGE": int(os.environ.get("CONN_MAX_AGE", 60 if PRODUCTION else 0)),
     }
 }
 
+# Ping reused connections before the first query of a request and reconnect
+# if the server dropped them (Django 4.0 has no CONN_HEALTH_CHECKS).
+DB_CONN_HEALTH_CHECKS = PRODUCTION
+
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10_000},
+    },
+}
+
+if os.environ.get("REDIS_URL"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["REDIS_URL"],
+    }
+
+
+# Throttle counters; shared by all workers when this is the Redis cache.
+THROTTLE_CACHE_ALIAS = "default"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -131,7 +173,7 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.0/howto/static-files/
 STATIC_URL = "/static/"
-STATIC_ROOT = os.path.join(BASE_DIR, "static")
+STATIC_ROOT = os.environ.get("STATIC_ROOT", os.path.join(BASE_DIR, "static"))
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = "/files/media"
@@ -143,14 +185,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "social_media.throttling.AnonThrottle",
+        "social_media.throttling.UserThrottle",
+        "social_media.throttling.ScopedThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "300/day"},
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/day",
+        "user": "300/day",
+        "likes": "120/hour",
+        "follows": "60/hour",
+        "comments": "30/hour",
+        "exports": "5/day",
+    },
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.StatelessJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "social_media.pagination.KeysetPagination",
+    "PAGE_SIZE": 20,
 }
 
 SPECTACULAR_SETTINGS = {
@@ -171,4 +223,83 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_OBTAIN_SERIALIZER": "user.authentication.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "user.authentication.TokenRefreshSerializer",
+    "TOKEN_BLACKLIST_SERIALIZER": "user.authentication.TokenBlacklistSerializer",
 }
+
+# Build request.user from access token claims instead of loading the row.
+JWT_TOKEN_USER = os.environ.get("JWT_TOKEN_USER", "") == "1"
+JWT_TOKEN_USER_CACHE_TTL = 30
+
+# Background tasks run in a per-process thread pool after the transaction commits.
+BACKGROUND_TASKS_EAGER = os.environ.get("BACKGROUND_TASKS_EAGER", "") == "1"
+BACKGROUND_TASK_WORKERS = int(os.environ.get("BACKGROUND_TASK_WORKERS", 4))
+
+# Threads, and so database connections, per process for the concurrent
+# queries of async read views; see social_media/async_views.py.
+ASYNC_QUERY_WORKERS = int(os.environ.get("ASYNC_QUERY_WORKERS", 8))
+
+# Home timeline: authors with more followers than this are merged in at read time.
+TIMELINE_FANOUT_LIMIT = 10_000
+TIMELINE_BACKFILL_SIZE = 200
+
+# Latest top-level comments embedded in post payloads; threads load through
+# /api/post/Comment/<id>/replies/.
+COMMENT_PREVIEW_SIZE = 3
+
+# Trending hashtags; see post/trending.py. Usage is counted per bucket and
+# decays with the half-life; the top TRENDING_SIZE are recomputed in the
+# background once the snapshot is older than TRENDING_REFRESH_INTERVAL seconds.
+# With no snapshot yet, requests wait up to TRENDING_COLD_WAIT seconds for the
+# one that builds it.
+TRENDING_BUCKET_SECONDS = 3600
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 6
+TRENDING_SIZE = 50
+TRENDING_REFRESH_INTERVAL = 300
+TRENDING_COLD_WAIT = 5
+
+# Most ids accepted by one batch like, follow or relationship request.
+BATCH_MAX_IDS = 100
+
+# Notifications are grouped per window and written in batches from an
+# in-process buffer; see notifications/events.py.
+NOTIFICATION_WINDOW_SECONDS = 6 * 3600
+NOTIFICATION_FLUSH_SIZE = 500
+NOTIFICATION_FLUSH_INTERVAL = 2
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = 24 * 3600
+
+# Account exports read rows in chunks of this size; see user/export.py.
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Detail responses cached per object; see social_media/response_cache.py.
+RESPONSE_CACHE_ALIAS = "default"
+RESPONSE_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_GRACE = 30
+RESPONSE_CACHE_LOCK_TIMEOUT = 5
+
+# Buffer like counter increments in memory and write them in batches.
+LIKE_COUNTER_BUFFERED = os.environ.get("LIKE_COUNTER_BUFFERED", "") == "1"
+LIKE_COUNTER_FLUSH_SIZE = 500
+LIKE_COUNTER_FLUSH_INTERVAL = 2
+
+# Uploaded images are re-encoded to WebP renditions bounded by these sizes.
+IMAGE_RENDITIONS = {
+    "thumbnail": 160,
+    "small": 480,
+    "medium": 1080,
+    "large": 2048,
+}
+IMAGE_WEBP_QUALITY = 80
+POST_MAX_IMAGES_PER_UPLOAD = 10
+
+# Request metrics at /metrics; see social_media/metrics.py. Scrapers must send
+# "Authorization: Bearer <token>"; without a token the endpoint is closed.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+METRICS_SLOW_REQUEST_MS = int(os.environ.get("METRICS_SLOW_REQUEST_MS", 1000))
+METRICS_SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get("METRICS_SLOW_REQUEST_SAMPLE_RATE", 1.0))
+
+# Search backend for /api/search/; InMemorySearchBackend works without Postgres.
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "search.backends.PostgresSearchBackend")
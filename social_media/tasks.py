@@ -0,0 +1,56 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASK_WORKERS,
+            thread_name_prefix="background-task",
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", func.__name__)
+    finally:
+        close_old_connections()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func`` off the request path once the current transaction commits.
+
+    With ``BACKGROUND_TASKS_EAGER`` the task runs inline in the commit hook,
+    which keeps tests deterministic.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        transaction.on_commit(lambda: func(*args, **kwargs))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, func, args, kwargs))
+
+
+def enqueue_later(delay, func, *args, **kwargs):
+    """Run ``func`` on the background pool in ``delay`` seconds.
+
+    Unlike ``enqueue`` it does not wait for a transaction. With
+    ``BACKGROUND_TASKS_EAGER`` the task runs right away.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        func(*args, **kwargs)
+        return
+    timer = threading.Timer(delay, _get_executor().submit, (_run, func, args, kwargs))
+    timer.daemon = True
+    timer.start()
@@ -0,0 +1,15 @@
+"""Helpers shared by the apps' test modules."""
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+
+def jpeg_upload(color="red", size=(800, 600)):
+    """A JPEG upload carrying EXIF metadata, as phones send them."""
+    image = Image.new("RGB", size, color)
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    buffer = BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
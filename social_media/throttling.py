@@ -0,0 +1,146 @@
+"""Request throttles backed by a shared GCRA counter.
+
+Each check is a single atomic operation on ``THROTTLE_CACHE_ALIAS``: with
+Redis it is one ``EVALSHA`` of a GCRA script, so the limit holds across
+every worker. Other cache backends (LocMem in tests and development) use an
+in-process implementation of the same algorithm.
+
+GCRA keeps one number per key, the theoretical arrival time of the next
+request, instead of DRF's list of timestamps. A ``100/hour`` rate lets a
+client burst up to 100 requests and then refills one every 36 seconds.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+KEY_FORMAT = "throttle:{scope}:{ident}"
+
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local tat = tonumber(redis.call("GET", KEYS[1]) or ARGV[1])
+if tat < now then
+    tat = now
+end
+local allow_at = tat + interval - period
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+redis.call("SET", KEYS[1], tostring(tat + interval), "PX", math.ceil((tat + interval - now) * 1000))
+return false
+"""
+
+
+class ThrottleStore:
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+
+class RedisThrottleStore(ThrottleStore):
+    _script = None
+
+    def acquire(self, key, interval, period, now):
+        """Return ``None`` if allowed, else the seconds to wait."""
+        key = self.cache.make_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        if self._script is None:
+            self._script = client.register_script(GCRA_SCRIPT)
+        wait = self._script(keys=[key], args=[now, interval, period], client=client)
+        return None if wait is None else float(wait)
+
+
+class LocalThrottleStore(ThrottleStore):
+    """The GCRA script for caches without server-side scripting.
+
+    Only atomic within one process, which is all LocMem can share anyway.
+    """
+
+    def __init__(self, alias):
+        super().__init__(alias)
+        self._lock = threading.Lock()
+
+    def acquire(self, key, interval, period, now):
+        with self._lock:
+            tat = max(self.cache.get(key, now), now)
+            allow_at = tat + interval - period
+            if now < allow_at:
+                return allow_at - now
+            self.cache.set(key, tat + interval, math.ceil(tat + interval - now))
+            return None
+
+
+_stores = {}
+
+
+def get_throttle_store():
+    alias = settings.THROTTLE_CACHE_ALIAS
+    if alias not in _stores:
+        store_class = RedisThrottleStore if isinstance(caches[alias], RedisCache) else LocalThrottleStore
+        _stores[alias] = store_class(alias)
+    return _stores[alias]
+
+
+class GCRAThrottle(BaseThrottle):
+    """Base class; subclasses pick the scope and the identity of the client."""
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_ident_for(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        ident = self.get_ident_for(request)
+        if rate is None or ident is None:
+            return True
+
+        num_requests, period = SimpleRateThrottle.parse_rate(None, rate)
+        key = KEY_FORMAT.format(scope=scope, ident=ident)
+        self.wait_seconds = get_throttle_store().acquire(key, period / num_requests, period, time.time())
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonThrottle(GCRAThrottle):
+    scope = "anon"
+
+    def get_ident_for(self, request):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserThrottle(GCRAThrottle):
+    scope = "user"
+
+    def get_ident_for(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+
+class ScopedThrottle(UserThrottle):
+    """Per-endpoint budget named by the view's ``throttle_scope``.
+
+    Actions set it with ``@action(throttle_scope=...)``; views without one
+    are not limited by this throttle.
+    """
+
+    def get_scope(self, view):
+        return getattr(view, "throttle_scope", None)
@@ -19,6 +19,9 @@ from django.conf.urls.static import static
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from .metrics import metrics_view
+from .views import ResponseCacheStatsView
+
 urlpatterns = [
                   path("admin/", admin.site.urls),
                   path("api/post/", include("post.urls", namespace="post")),
@@ -26,6 +29,10 @@ urlpatterns = [
                       "api/user/",
                       include("user.urls", namespace="user")
                   ),
+                  path("api/search/", include("search.urls", namespace="search")),
+                  path("api/notifications/", include("notifications.urls", namespace="notifications")),
+                  path("api/cache/stats/", ResponseCacheStatsView.as_view(), name="response-cache-stats"),
+                  path("metrics", metrics_view, name="metrics"),
                   path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
                   path(
                       "api/doc/swagger/",
@@ -37,5 +44,7 @@ urlpatterns = [
                       SpectacularRedocView.as_view(url_name="schema"),
                       name="redoc"
                   ),
-                  path("__debug__/", include("debug_toolbar.urls")),
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media.settings')
 
 application = get_wsgi_application()
+
+from social_media.db import install_connection_health_checks  # noqa: E402
+
+install_connection_health_checks()
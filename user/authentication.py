@@ -0,0 +1,147 @@
+"""JWT authentication that can trust the access token instead of the database.
+
+Access tokens carry ``is_staff``/``is_superuser`` and the jti of the refresh
+token they came from. With ``JWT_TOKEN_USER`` the user row is not loaded per
+request: ``request.user`` is a ``LazyTokenUser`` answering ``pk`` and the
+permission flags from the claims, and only a view that reads anything else
+loads the row, through a short per-process cache. Revocation is checked
+against a per-process set of blacklisted jtis that is reloaded only when a
+token is blacklisted, never with a table lookup per request.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework_simplejwt import authentication, serializers, tokens
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+REFRESH_JTI_CLAIM = "rjti"
+BLACKLIST_VERSION_KEY = "auth:blacklist-version"
+
+
+class TokenBlacklist:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._jtis = frozenset()
+
+    def jtis(self):
+        version = cache.get(BLACKLIST_VERSION_KEY)
+        if version is None:
+            cache.add(BLACKLIST_VERSION_KEY, time.time_ns(), None)
+            version = cache.get(BLACKLIST_VERSION_KEY)
+        with self._lock:
+            if version != self._version:
+                self._jtis = frozenset(
+                    BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+                    .values_list("token__jti", flat=True)
+                )
+                self._version = version
+            return self._jtis
+
+    def __contains__(self, jti):
+        return jti in self.jtis()
+
+    def invalidate(self):
+        cache.set(BLACKLIST_VERSION_KEY, time.time_ns(), None)
+
+
+token_blacklist = TokenBlacklist()
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in token_blacklist:
+            raise TokenError("Token is blacklisted")
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        access[REFRESH_JTI_CLAIM] = self.payload[api_settings.JTI_CLAIM]
+        return access
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["is_staff"] = user.is_staff
+        token["is_superuser"] = user.is_superuser
+        return token
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = RefreshToken
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenBlacklistSerializer(serializers.TokenBlacklistSerializer):
+    token_class = RefreshToken
+
+
+class UserCache:
+    """Full user rows kept per process for ``JWT_TOKEN_USER_CACHE_TTL`` seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+
+    def get(self, pk):
+        now = time.monotonic()
+        with self._lock:
+            expires, user = self._users.get(pk, (0, None))
+        if expires > now:
+            return user
+        user = get_user_model().objects.get(pk=pk)
+        with self._lock:
+            self._users[pk] = (now + settings.JWT_TOKEN_USER_CACHE_TTL, user)
+        return user
+
+    def forget(self, pk):
+        with self._lock:
+            self._users.pop(pk, None)
+
+
+user_cache = UserCache()
+
+
+class LazyTokenUser(TokenUser):
+    """A ``TokenUser`` that falls back to the cached ``User`` for anything else."""
+
+    @cached_property
+    def user(self):
+        return user_cache.get(self.pk)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __str__(self):
+        return str(self.user)
+
+
+class StatelessJWTAuthentication(authentication.JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if token.get(REFRESH_JTI_CLAIM) in token_blacklist:
+            raise InvalidToken({
+                "detail": "Token is blacklisted",
+                "messages": [{"token_class": type(token).__name__, "message": "Token is blacklisted"}],
+            })
+        return token
+
+    def get_user(self, validated_token):
+        if not settings.JWT_TOKEN_USER:
+            return super().get_user(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Token contained no recognizable user identification")
+        return LazyTokenUser(validated_token)
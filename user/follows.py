@@ -0,0 +1,144 @@
+"""Follow graph writes and the cached adjacency set.
+
+Each write is a single SQL statement against ``Follow``, also for batches of
+users, and announces the changed edges through ``follow_created``/``follow_removed``
+(``follows_created``/``follows_removed`` for batches) so other apps (home
+timelines, caches) can react without hooking into the join table.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+from django.db import connection
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Follow
+
+# Sent with ``follower_id`` and ``followee_id`` whenever an edge is added or removed.
+follow_created = Signal()
+follow_removed = Signal()
+# Sent once per batch write with ``follower_id`` and the set of ``followee_ids``
+# whose edges changed, so receivers can handle the batch with set-based statements.
+follows_created = Signal()
+follows_removed = Signal()
+
+FOLLOWING_IDS_KEY = "follows:following:{}"
+FOLLOWING_IDS_TIMEOUT = 60 * 60
+
+
+def _table():
+    return connection.ops.quote_name(Follow._meta.db_table)
+
+
+def follow(follower_id, followee_id):
+    """Follow a user; returns ``False`` if the edge already existed."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {_table()} (follower_id, followee_id, created_at) "
+            f"VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
+            [follower_id, followee_id, timezone.now()],
+        )
+        created = cursor.rowcount == 1
+    if created:
+        follow_created.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+    return created
+
+
+def unfollow(follower_id, followee_id):
+    """Remove a follow edge; returns ``False`` if there was none."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {_table()} WHERE follower_id = %s AND followee_id = %s",
+            [follower_id, followee_id],
+        )
+        deleted = cursor.rowcount == 1
+    if deleted:
+        follow_removed.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+    return deleted
+
+
+def toggle_follow(follower_id, followee_id):
+    """Unfollow if following, follow otherwise, in one statement.
+
+    Returns ``True`` if the user is now followed.
+    """
+    table = _table()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH deleted AS ("
+            f"  DELETE FROM {table} WHERE follower_id = %s AND followee_id = %s RETURNING id"
+            f"), inserted AS ("
+            f"  INSERT INTO {table} (follower_id, followee_id, created_at)"
+            f"  SELECT %s, %s, %s WHERE NOT EXISTS (SELECT 1 FROM deleted)"
+            f"  ON CONFLICT DO NOTHING RETURNING id"
+            f") SELECT (SELECT COUNT(*) FROM deleted), (SELECT COUNT(*) FROM inserted)",
+            [follower_id, followee_id, follower_id, followee_id, timezone.now()],
+        )
+        deleted, inserted = cursor.fetchone()
+    if deleted:
+        follow_removed.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+        return False
+    if inserted:
+        follow_created.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+    return True
+
+
+def follow_many(follower_id, followee_ids):
+    """Follow each of ``followee_ids``; returns the ones not followed yet."""
+    if not followee_ids:
+        return set()
+    now = timezone.now()
+    values = ", ".join(["(%s, %s, %s)"] * len(followee_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {_table()} (follower_id, followee_id, created_at) VALUES {values} "
+            f"ON CONFLICT DO NOTHING RETURNING followee_id",
+            [value for followee_id in sorted(followee_ids) for value in (follower_id, followee_id, now)],
+        )
+        created = {followee_id for followee_id, in cursor.fetchall()}
+    if created:
+        follows_created.send(sender=Follow, follower_id=follower_id, followee_ids=created)
+    return created
+
+
+def unfollow_many(follower_id, followee_ids):
+    """Unfollow each of ``followee_ids``; returns the ones that were followed."""
+    if not followee_ids:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {_table()} WHERE follower_id = %s AND followee_id = ANY(%s) RETURNING followee_id",
+            [follower_id, sorted(followee_ids)],
+        )
+        deleted = {followee_id for followee_id, in cursor.fetchall()}
+    if deleted:
+        follows_removed.send(sender=Follow, follower_id=follower_id, followee_ids=deleted)
+    return deleted
+
+
+def following_ids(user_id):
+    """Sorted ids of the users ``user_id`` follows, as a compact ``array``."""
+    key = FOLLOWING_IDS_KEY.format(user_id)
+    packed = cache.get(key)
+    ids = array("q")
+    if packed is None:
+        ids.extend(
+            Follow.objects.filter(follower_id=user_id)
+            .order_by("followee_id")
+            .values_list("followee_id", flat=True)
+        )
+        cache.set(key, ids.tobytes(), FOLLOWING_IDS_TIMEOUT)
+    else:
+        ids.frombytes(packed)
+    return ids
+
+
+def is_following(user_id, other_id):
+    ids = following_ids(user_id)
+    index = bisect_left(ids, other_id)
+    return index < len(ids) and ids[index] == other_id
+
+
+def invalidate_following_ids(user_id):
+    cache.delete(FOLLOWING_IDS_KEY.format(user_id))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.export import export_lines
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = "Write a user's posts, comments, likes, follows and media references as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("user", help="Id or email of the user.")
+        parser.add_argument("--output", help="File to write to instead of stdout.")
+
+    def handle(self, *args, **options):
+        lookup = {"pk": options["user"]} if options["user"].isdigit() else {"email__iexact": options["user"]}
+        user_id = User.objects.filter(**lookup).values_list("pk", flat=True).first()
+        if user_id is None:
+            raise CommandError(f"No user {options['user']!r}.")
+
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.writelines(export_lines(user_id))
+        else:
+            for line in export_lines(user_id):
+                self.stdout.write(line, ending="")
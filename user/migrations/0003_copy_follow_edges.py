@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+def copy_follow_edges(apps, schema_editor):
+    """Merge the old followers/followings join tables into Follow rows.
+
+    ``a.followings`` held ``a -> b`` and ``b.followers`` held the same edge
+    the other way round, so both are read and duplicates are dropped.
+    """
+    User = apps.get_model("user", "User")
+    Follow = apps.get_model("user", "Follow")
+    quote = schema_editor.quote_name
+    follow_table = quote(Follow._meta.db_table)
+    followings_table = quote(User.followings.through._meta.db_table)
+    followers_table = quote(User.followers.through._meta.db_table)
+
+    schema_editor.execute(
+        f"INSERT INTO {follow_table} (follower_id, followee_id, created_at) "
+        f"SELECT from_user_id, to_user_id, CURRENT_TIMESTAMP FROM {followings_table} "
+        f"UNION SELECT to_user_id, from_user_id, CURRENT_TIMESTAMP FROM {followers_table} "
+        f"ON CONFLICT DO NOTHING"
+    )
+
+
+def copy_follow_edges_back(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    Follow = apps.get_model("user", "Follow")
+    edges = Follow.objects.values_list("follower_id", "followee_id")
+    User.followings.through.objects.bulk_create(
+        User.followings.through(from_user_id=follower_id, to_user_id=followee_id)
+        for follower_id, followee_id in edges
+    )
+    User.followers.through.objects.bulk_create(
+        User.followers.through(from_user_id=followee_id, to_user_id=follower_id)
+        for follower_id, followee_id in edges
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0002_follow'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_follow_edges, copy_follow_edges_back),
+    ]
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_copy_follow_edges'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='followers',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='followings',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followings',
+            field=models.ManyToManyField(blank=True, related_name='followers', through='user.Follow', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
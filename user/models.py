@@ -1,17 +1,31 @@
 import os
-import uuid
+from django.apps import apps
 from django.conf import settings
 
 from django.contrib.auth.models import (
     AbstractUser,
     BaseUserManager,
 )
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
-from django.utils.text import slugify
+from django.db.models import OuterRef
+from django.db.models.functions import Upper
 from django.utils.translation import gettext as _
 
+from social_media.db import SubqueryCount
+from social_media.images import ImageStatus
 
-class UserManager(BaseUserManager):
+
+class UserQuerySet(models.QuerySet):
+    def with_counts(self):
+        return self.annotate(
+            followers_count=SubqueryCount(Follow.objects.filter(followee=OuterRef("pk"))),
+            followings_count=SubqueryCount(Follow.objects.filter(follower=OuterRef("pk"))),
+            posts_count=SubqueryCount(apps.get_model("post", "Post").objects.filter(author=OuterRef("pk"))),
+        )
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     """Define a model manager for User model with no username field."""
 
     use_in_migrations = True
@@ -46,10 +60,8 @@ class UserManager(BaseUserManager):
 
 
 def user_image_file_path(instance, filename: str):
-    _, extension = os.path.splitext(filename)
-    filename = f"{slugify(instance.last_name)}-{uuid.uuid4()}{extension}"
-
-    return os.path.join("uploads", "users", filename)
+    """Staging path; processed renditions live in ``uploads/users/<sha256>/``."""
+    return os.path.join("uploads", "users", "incoming", filename)
 
 
 class User(AbstractUser):
@@ -57,14 +69,14 @@ class User(AbstractUser):
     email = models.EmailField(_("email address"), unique=True)
     bio = models.TextField()
     profile_pic = models.ImageField(null=True, blank=True, upload_to=user_image_file_path)
-    followers = models.ManyToManyField(
-        settings.AUTH_USER_MODEL,
-        related_name="followed_users",
-        blank=True
-    )
+    profile_pic_status = models.CharField(max_length=10, choices=ImageStatus.choices, blank=True)
+    profile_pic_renditions = models.JSONField(default=dict, blank=True)
     followings = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
-        related_name="following_users",
+        through="Follow",
+        through_fields=("follower", "followee"),
+        symmetrical=False,
+        related_name="followers",
         blank=True
     )
 
@@ -73,3 +85,37 @@ class User(AbstractUser):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            GinIndex(fields=["email"], opclasses=["gin_trgm_ops"], name="user_email_trgm_idx"),
+            GinIndex(fields=["first_name"], opclasses=["gin_trgm_ops"], name="user_first_name_trgm_idx"),
+            GinIndex(fields=["last_name"], opclasses=["gin_trgm_ops"], name="user_last_name_trgm_idx"),
+            # ``iexact`` filters compare UPPER() of the column.
+            models.Index(Upper("email"), name="user_email_upper_idx"),
+            models.Index(Upper("last_name"), name="user_last_name_upper_idx"),
+        ]
+
+
+class Follow(models.Model):
+    """A single follow edge; both directions of the graph are read from it."""
+    follower = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="following_edges")
+    followee = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="follower_edges")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["follower", "followee"], name="unique_follow"),
+        ]
+        indexes = [
+            # Follower and following pages, newest follow first.
+            models.Index(
+                fields=["followee", "-created_at", "-id"], include=["follower"], name="follow_followee_created_idx"
+            ),
+            models.Index(
+                fields=["follower", "-created_at", "-id"], include=["followee"], name="follow_follower_created_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} -> {self.followee_id}"
+
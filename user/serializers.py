@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from social_media.images import RenditionsField
 from .models import User
 
 
 class UserSerializer(serializers.ModelSerializer):
+    profile_pic_renditions = RenditionsField()
+
     class Meta:
         model = User
         fields = ("id",
@@ -15,7 +19,8 @@ class UserSerializer(serializers.ModelSerializer):
                   "bio",
                   "followers",
                   "followings",
-                  "profile_pic")
+                  "profile_pic",
+                  "profile_pic_renditions")
         extra_kwargs = {"password": {"write_only": True, "min_length": 8}}
 
     def create(self, validated_data):
@@ -27,25 +32,44 @@ class UserSerializer(serializers.ModelSerializer):
 
 
 class UserListSerializer(UserSerializer):
-    following = serializers.IntegerField(source="following.count", read_only=True)
-    followers = serializers.IntegerField(source="followers.count", read_only=True)
-    posts = serializers.IntegerField(source="posts.count", read_only=True)
+    following = serializers.IntegerField(source="followings_count", read_only=True)
+    followers = serializers.IntegerField(source="followers_count", read_only=True)
+    posts = serializers.IntegerField(source="posts_count", read_only=True)
 
     class Meta:
         model = get_user_model()
         fields = ("id",
-                  "username",
                   "email",
                   "first_name",
                   "last_name",
-                  "profile_pic",
+                  "profile_pic_renditions",
                   "following",
                   "followers",
                   "posts")
 
 
 class UserImageSerializer(serializers.ModelSerializer):
+    profile_pic_renditions = RenditionsField()
+
     class Meta:
         model = get_user_model()
-        fields = ("id", "profile_pic")
+        fields = ("id", "profile_pic", "profile_pic_status", "profile_pic_renditions")
+        read_only_fields = ("profile_pic_status",)
+        extra_kwargs = {"profile_pic": {"required": True, "allow_null": False}}
+
+
+def _user_ids_field():
+    return serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_IDS,
+    )
+
+
+class FollowBatchSerializer(serializers.Serializer):
+    users = _user_ids_field()
+    following = serializers.BooleanField(default=True)
+
 
+class RelationshipsQuerySerializer(serializers.Serializer):
+    ids = _user_ids_field()
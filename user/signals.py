@@ -0,0 +1,57 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from social_media.response_cache import response_cache
+from .authentication import token_blacklist, user_cache
+from .follows import follow_created, follow_removed, follows_created, follows_removed, invalidate_following_ids
+from .models import Follow, User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    response_cache.bump(f"user:{instance.pk}")
+    user_cache.forget(instance.pk)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+@receiver(post_delete, sender=BlacklistedToken)
+def invalidate_token_blacklist(sender, **kwargs):
+    token_blacklist.invalidate()
+
+
+@receiver(m2m_changed, sender=Follow)
+def relay_follow_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """Turn ``user.followings``/``user.followers`` manager writes into follow signals."""
+    if action == "pre_clear":
+        related = instance.followers if reverse else instance.followings
+        instance._cleared_follow_ids = set(related.values_list("pk", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = getattr(instance, "_cleared_follow_ids", set())
+        signal = follow_removed
+    elif action == "post_add":
+        signal = follow_created
+    elif action == "post_remove":
+        signal = follow_removed
+    else:
+        return
+
+    for pk in pk_set:
+        follower_id, followee_id = (pk, instance.pk) if reverse else (instance.pk, pk)
+        signal.send(sender=Follow, follower_id=follower_id, followee_id=followee_id)
+
+
+@receiver(follow_created)
+@receiver(follow_removed)
+def invalidate_follow_graph(sender, follower_id, followee_id, **kwargs):
+    invalidate_following_ids(follower_id)
+    response_cache.bump(f"user:{follower_id}", f"user:{followee_id}")
+
+
+@receiver(follows_created)
+@receiver(follows_removed)
+def invalidate_follow_graph_batch(sender, follower_id, followee_ids, **kwargs):
+    invalidate_following_ids(follower_id)
+    response_cache.bump(f"user:{follower_id}", *(f"user:{followee_id}" for followee_id in followee_ids))
@@ -1,9 +1,31 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 from rest_framework.test import APIClient
 from django.urls import reverse
 
+from post.models import Comment, Hashtag, Post, PostImage
+from social_media.images import ImageStatus, content_hash
+from social_media.testing import jpeg_upload
+from .authentication import LazyTokenUser, RefreshToken, user_cache
+from .export import export_lines
+from .follows import following_ids, is_following
+from .models import Follow
+
 
 class TestUser(TestCase):
     def setUp(self):
@@ -32,3 +54,299 @@ class TestUser(TestCase):
         following_user.followers.add(followed_user)
         response = self.client.get(reverse("user:user-detail", args=[followed_user.id]) + "followers/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_followings_list_paginated(self):
+        followings = [
+            get_user_model().objects.create_user(email=f"following{i}@email.com", password="testpass")
+            for i in range(3)
+        ]
+        for following in followings:
+            self.user.followings.add(following)
+        url = reverse("user:user-detail", args=[self.user.id]) + "following/"
+
+        response = self.client.get(url, {"page_size": 2})
+        self.assertEqual([item["id"] for item in response.data["results"]], [followings[2].id, followings[1].id])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([item["id"] for item in response.data["results"]], [followings[0].id])
+        self.assertIsNone(response.data["next"])
+
+    def test_liked_posts(self):
+        post = Post.objects.create(author=self.user, content="test")
+        post.likes.add(self.user)
+        response = self.client.get(reverse("user:user-detail", args=[self.user.id]) + "liked-posts/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [post.id])
+
+    def test_liked_posts_newest_like_first(self):
+        posts = [Post.objects.create(author=self.user, content=f"test {i}") for i in range(3)]
+        for post in (posts[1], posts[0], posts[2]):
+            self.client.put(reverse("post:post-like-state", args=[post.id]))
+        url = reverse("user:user-detail", args=[self.user.id]) + "liked-posts/"
+
+        response = self.client.get(url, {"page_size": 2})
+        self.assertEqual([item["id"] for item in response.data["results"]], [posts[2].id, posts[0].id])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([item["id"] for item in response.data["results"]], [posts[1].id])
+
+    def test_user_list_query_count_is_fixed(self):
+        for i in range(5):
+            user = get_user_model().objects.create_user(email=f"user{i}@email.com", password="testpass")
+            user.followers.add(self.user)
+            Post.objects.create(author=user, content="test")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("user:user-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][-1]["followers"], 1)
+        self.assertEqual(response.data["results"][-1]["posts"], 1)
+
+    def test_follow_unfollow_toggles_single_edge(self):
+        followed_user = get_user_model().objects.create_user(
+            email="followed@email.com", password="testpass"
+        )
+        url = reverse("user:user-detail", args=[followed_user.id]) + "follow-unfollow/"
+
+        self.client.post(url)
+        self.assertEqual(list(followed_user.followers.all()), [self.user])
+        self.assertEqual(list(self.user.followings.all()), [followed_user])
+        self.assertEqual(Follow.objects.count(), 1)
+
+        self.client.post(url)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_following_ids_cache_invalidated(self):
+        followed_user = get_user_model().objects.create_user(
+            email="followed@email.com", password="testpass"
+        )
+        self.assertFalse(is_following(self.user.id, followed_user.id))
+
+        self.user.followings.add(followed_user)
+        self.assertTrue(is_following(self.user.id, followed_user.id))
+        self.assertEqual(list(following_ids(self.user.id)), [followed_user.id])
+
+        self.client.post(reverse("user:user-detail", args=[followed_user.id]) + "follow-unfollow/")
+        self.assertFalse(is_following(self.user.id, followed_user.id))
+
+    def test_batch_follow_and_unfollow(self):
+        users = [
+            get_user_model().objects.create_user(email=f"followed{i}@email.com", password="testpass")
+            for i in range(3)
+        ]
+        self.user.followings.add(users[0])
+        missing = users[-1].id + 1
+        url = reverse("user:user-follow-batch")
+
+        response = self.client.post(url, {"users": [users[0].id, users[1].id, missing]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"user": users[0].id, "following": True, "changed": False},
+            {"user": users[1].id, "following": True, "changed": True},
+            {"user": missing, "error": "not_found"},
+        ])
+        self.assertEqual(list(following_ids(self.user.id)), [users[0].id, users[1].id])
+
+        response = self.client.post(
+            url, {"users": [users[1].id, users[2].id], "following": False}, format="json"
+        )
+        self.assertEqual([item["changed"] for item in response.data["results"]], [True, False])
+        self.assertEqual(list(self.user.followings.all()), [users[0]])
+
+    def test_batch_follow_statements_do_not_grow_with_the_batch(self):
+        users = [
+            get_user_model().objects.create_user(email=f"followed{i}@email.com", password="testpass")
+            for i in range(6)
+        ]
+        for user in users:
+            Post.objects.create(author=user, content="test")
+        url = reverse("user:user-follow-batch")
+
+        for following in (True, False):
+            counts = []
+            for batch in (users[:2], users[2:]):
+                with CaptureQueriesContext(connection) as context:
+                    self.client.post(
+                        url, {"users": [user.id for user in batch], "following": following}, format="json"
+                    )
+                counts.append(len(context.captured_queries))
+            with self.subTest(following=following):
+                self.assertEqual(counts[0], counts[1])
+        self.assertFalse(self.user.timeline_entries.exists())
+
+    def test_relationships(self):
+        followed, follower, mutual, stranger = (
+            get_user_model().objects.create_user(email=f"user{i}@email.com", password="testpass")
+            for i in range(4)
+        )
+        self.user.followings.add(followed, mutual)
+        self.user.followers.add(follower, mutual)
+        ids = [followed.id, follower.id, mutual.id, stranger.id, stranger.id + 1]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("user:user-relationships"), {"ids": ids})
+        self.assertEqual(response.data["results"], [
+            {"user": followed.id, "following": True, "followed_by": False},
+            {"user": follower.id, "following": False, "followed_by": True},
+            {"user": mutual.id, "following": True, "followed_by": True},
+            {"user": stranger.id, "following": False, "followed_by": False},
+            {"user": stranger.id + 1, "error": "not_found"},
+        ])
+        self.assertEqual(
+            self.client.get(reverse("user:user-relationships")).status_code, status.HTTP_400_BAD_REQUEST
+        )
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_newer_profile_pic_wins(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        url = reverse("user:user-detail", args=[self.user.id]) + "upload-image/"
+
+        with override_settings(MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks() as first:
+                response = self.client.post(url, {"profile_pic": jpeg_upload("red")}, format="multipart")
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data["profile_pic_status"], ImageStatus.PENDING)
+            with self.captureOnCommitCallbacks() as second:
+                self.client.post(url, {"profile_pic": jpeg_upload("blue")}, format="multipart")
+            for callback in second + first:
+                callback()
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_pic_status, ImageStatus.READY)
+        self.assertIn(self.user.profile_pic.name, self.user.profile_pic_renditions.values())
+        blue = jpeg_upload("blue")
+        self.assertIn(content_hash(blue), self.user.profile_pic.name)
+
+
+class TokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass", first_name="Test"
+        )
+        self.addCleanup(user_cache.forget, self.user.pk)
+        response = self.client.post(
+            reverse("user:user-obtain-pair"), {"email": "test@email.com", "password": "testpass"}
+        )
+        self.refresh = response.data["refresh"]
+        self.access = response.data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [query["sql"] for query in context.captured_queries if 'FROM "user_user"' in query["sql"]]
+
+    def test_access_token_carries_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual(token["user_id"], self.user.id)
+        self.assertFalse(token["is_staff"])
+        self.assertIn("rjti", token.payload)
+
+    def test_full_user_loaded_by_default(self):
+        self.assertEqual(len(self.user_queries(reverse("post:post-list"))), 1)
+
+    @override_settings(JWT_TOKEN_USER=True)
+    def test_token_user_skips_user_lookup(self):
+        self.assertEqual(self.user_queries(reverse("post:post-list")), [])
+
+    @override_settings(JWT_TOKEN_USER=True)
+    def test_token_user_loads_row_lazily(self):
+        user = LazyTokenUser(AccessToken(self.access))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, "Test")
+            self.assertEqual(user.email, "test@email.com")
+
+        self.user.first_name = "Changed"
+        self.user.save()
+        self.assertEqual(LazyTokenUser(AccessToken(self.access)).first_name, "Changed")
+
+    def test_logout_revokes_tokens(self):
+        response = self.client.post(reverse("user:user-logout"), {"refresh": self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(reverse("post:post-list"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse("user:user-refresh"), {"refresh": self.refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_blacklist_check_does_not_query(self):
+        self.client.get(reverse("post:post-list"))
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse("post:post-list"))
+        self.assertFalse(any("token_blacklist" in query["sql"] for query in context.captured_queries))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@email.com", password="testpass", bio="bio"
+        )
+        self.other = get_user_model().objects.create_user(
+            email="other@email.com", password="testpass"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(author=self.user, content="test #django")
+        self.post.hashtags.add(Hashtag.objects.create(name="django"))
+        PostImage.objects.create(
+            post=self.post,
+            position=0,
+            image="uploads/posts/incoming/photo.jpg",
+            image_renditions={"small": "uploads/posts/abc/small.webp"},
+        )
+        other_post = Post.objects.create(author=self.other, content="other")
+        Comment.objects.create(author=self.user, post=other_post, content="comment")
+        other_post.likes.add(self.user)
+        self.user.followings.add(self.other)
+        self.user.followers.add(self.other)
+        self.other_post = other_post
+        self.url = reverse("user:user-export", args=[self.user.id])
+
+    def assert_export(self, lines):
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [record["type"] for record in records],
+            ["user", "post", "media", "comment", "like", "following", "follower"],
+        )
+        user, post, media, comment, like, following, follower = records
+        self.assertEqual((user["email"], user["bio"]), ("test@email.com", "bio"))
+        self.assertEqual((post["id"], post["hashtags"]), (self.post.id, ["django"]))
+        self.assertTrue(media["renditions"]["small"].endswith("uploads/posts/abc/small.webp"))
+        self.assertEqual(comment["post_id"], self.other_post.id)
+        self.assertEqual(like["post_id"], self.other_post.id)
+        self.assertEqual(following["user_id"], self.other.id)
+        self.assertEqual(follower["user_id"], self.other.id)
+
+    def test_export_streams_ndjson(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assert_export(b"".join(response.streaming_content).decode().splitlines())
+
+    async def test_export_under_asgi(self):
+        access = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.get(self.url, AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="user-{self.user.id}.ndjson"')
+        self.assert_export(b"".join(response.streaming_content).decode().splitlines())
+
+    def test_only_own_account(self):
+        response = self.client.get(reverse("user:user-export", args=[self.other.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_rows_read_in_chunks(self):
+        with mock.patch("django.db.models.QuerySet.iterator", autospec=True,
+                        side_effect=QuerySet.iterator) as iterator:
+            list(export_lines(self.user.id))
+        self.assertEqual(iterator.call_count, 6)
+        self.assertTrue(all(
+            call.kwargs["chunk_size"] == settings.EXPORT_CHUNK_SIZE for call in iterator.call_args_list
+        ))
+
+    def test_command(self):
+        out = StringIO()
+        call_command("export_user_data", self.user.email, stdout=out)
+        self.assert_export(out.getvalue().splitlines())
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
 from rest_framework_simplejwt.views import (
+    TokenBlacklistView,
     TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
@@ -16,6 +17,7 @@ urlpatterns = [path("users/register/", CreateUserView.as_view(), name="user-crea
                path("users/login/", TokenObtainPairView.as_view(), name="user-obtain-pair"),
                path("users/login/refresh/", TokenRefreshView.as_view(), name="user-refresh"),
                path("users/login/verify/", TokenVerifyView.as_view(), name="user-verify"),
+               path("users/logout/", TokenBlacklistView.as_view(), name="user-logout"),
 
                ] + router.urls
 
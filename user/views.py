@@ -1,42 +1,93 @@
-from django.db.models import Q
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Prefetch, Q
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import generics, viewsets, mixins, status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .authentication import StatelessJWTAuthentication
 from .permissions import IsAuthorOrIfAuthenticatedReadOnly
-from .models import User
+from .export import export_file, export_lines
+from .follows import follow_many, toggle_follow, unfollow_many
+from .models import Follow, User
 
 from .serializers import (
     UserSerializer,
     UserListSerializer,
     UserImageSerializer,
+    FollowBatchSerializer,
+    RelationshipsQuerySerializer,
 )
 from post.serializers import PostSerializer
+from post.models import Post
+from social_media.async_views import AsyncReadMixin
+from social_media.images import accept_upload
+from social_media.metrics import SerializerTimingMixin
+from social_media.pagination import (
+    CreatedAtKeysetPagination,
+    FollowedAtKeysetPagination,
+    LikedAtKeysetPagination,
+)
+from social_media.query_plans import QueryPlan, QueryPlanMixin
+from social_media.response_cache import CachedRetrieveMixin
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(SerializerTimingMixin, generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
-class UserViewSet(mixins.ListModelMixin,
+USER_DETAIL_PLAN = QueryPlan(prefetch_related=("followers", "followings"))
+USER_POSTS_PLAN = QueryPlan(
+    prefetch_related=(
+        "hashtags",
+        "images",
+        Prefetch("comment_preview", to_attr="comment_preview"),
+    ),
+)
+
+
+class UserViewSet(SerializerTimingMixin,
+                  AsyncReadMixin,
+                  QueryPlanMixin,
+                  CachedRetrieveMixin,
+                  mixins.ListModelMixin,
                   mixins.RetrieveModelMixin,
                   mixins.UpdateModelMixin,
                   mixins.DestroyModelMixin,
                   GenericViewSet):
     serializer_class = UserSerializer
     queryset = User.objects.all()
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (StatelessJWTAuthentication,)
     permission_classes = (IsAuthorOrIfAuthenticatedReadOnly,)
+    cache_namespace = "user"
+    throttle_scope = None
+    async_actions = ("followers", "following", "posts", "liked_posts")
+    query_plans = {
+        "list": QueryPlan(annotate=("with_counts",)),
+        "retrieve": USER_DETAIL_PLAN,
+        "followers": USER_DETAIL_PLAN,
+        "following": USER_DETAIL_PLAN,
+        "posts": USER_POSTS_PLAN,
+        "liked_posts": USER_POSTS_PLAN,
+    }
 
     def get_serializer_class(self):
         if self.action == "list":
             return UserListSerializer
         if self.action == "upload_image":
             return UserImageSerializer
+        if self.action == "follow_batch":
+            return FollowBatchSerializer
+        if self.action == "relationships":
+            return RelationshipsQuerySerializer
+        if self.action in ("posts", "liked_posts"):
+            return PostSerializer
         return self.serializer_class
 
     def get_queryset(self):
@@ -44,7 +95,10 @@ class UserViewSet(mixins.ListModelMixin,
         queryset = self.queryset
 
         if email:
-            queryset = queryset.filter(email__icontains=email)
+            queryset = queryset.filter(email__iexact=email)
+
+        if self.action in ("list", "retrieve"):
+            queryset = self.plan_queryset(queryset)
 
         return queryset
 
@@ -53,45 +107,134 @@ class UserViewSet(mixins.ListModelMixin,
         user = self.get_object()
         serializer = self.get_serializer(user, data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        accept_upload(user, "profile_pic", serializer.validated_data["profile_pic"])
+        return Response(self.get_serializer(user).data, status=status.HTTP_202_ACCEPTED)
 
-    @action(detail=True, methods=["POST"], url_path="follow-unfollow", permission_classes=[IsAuthenticated])
+    @action(
+        detail=True,
+        methods=["POST"],
+        url_path="follow-unfollow",
+        permission_classes=[IsAuthenticated],
+        throttle_scope="follows",
+    )
     def follow_unfollow(self, request, pk=None):
         following = self.get_object()
-        follower = self.request.user
-        if following in follower.followings.all():
-            follower.followings.remove(following)
-            following.followers.remove(follower)
-            return Response(status=status.HTTP_200_OK)
-        follower.followings.add(following)
-        following.followers.add(follower)
+        toggle_follow(request.user.pk, following.pk)
         return Response(status=status.HTTP_200_OK)
 
-    @action(detail=True, methods=["GET"], url_path="followers", permission_classes=[IsAuthenticated])
+    @action(
+        detail=False,
+        methods=["POST"],
+        url_path="follow",
+        permission_classes=[IsAuthenticated],
+        throttle_scope="follows",
+    )
+    def follow_batch(self, request):
+        """Follow (``"following": true``) or unfollow up to ``BATCH_MAX_IDS`` users at once."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = list(dict.fromkeys(serializer.validated_data["users"]))
+        following = serializer.validated_data["following"]
+        with transaction.atomic():
+            found = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+            changed = (follow_many if following else unfollow_many)(request.user.pk, found)
+        return Response({"results": [
+            {"user": user_id, "following": following, "changed": user_id in changed}
+            if user_id in found else {"user": user_id, "error": "not_found"}
+            for user_id in user_ids
+        ]})
+
+    @action(detail=False, methods=["GET"], url_path="relationships", permission_classes=[IsAuthenticated])
+    def relationships(self, request):
+        """Whether the current user follows, and is followed by, each of ``?ids=``."""
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        user_ids = list(dict.fromkeys(serializer.validated_data["ids"]))
+        me = request.user.pk
+        found = {
+            pk: (following, followed_by)
+            for pk, following, followed_by in User.objects.filter(pk__in=user_ids).annotate(
+                following=Exists(Follow.objects.filter(follower_id=me, followee=OuterRef("pk"))),
+                followed_by=Exists(Follow.objects.filter(follower=OuterRef("pk"), followee_id=me)),
+            ).values_list("pk", "following", "followed_by")
+        }
+        return Response({"results": [
+            {"user": user_id, "following": found[user_id][0], "followed_by": found[user_id][1]}
+            if user_id in found else {"user": user_id, "error": "not_found"}
+            for user_id in user_ids
+        ]})
+
+    @action(
+        detail=True,
+        methods=["GET"],
+        url_path="export",
+        permission_classes=[IsAuthenticated],
+        throttle_scope="exports",
+    )
+    def export(self, request, pk=None):
+        """Stream the account's posts, comments, likes, follows and media as NDJSON."""
+        user = self.get_object()
+        if user.pk != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied("Only the account itself can be exported.")
+
+        def url(path):
+            return request.build_absolute_uri(default_storage.url(path))
+
+        filename = f"user-{user.pk}.ndjson"
+        if isinstance(request._request, ASGIRequest):
+            return FileResponse(
+                export_file(user.pk, url), as_attachment=True, filename=filename,
+                content_type="application/x-ndjson",
+            )
+        response = StreamingHttpResponse(export_lines(user.pk, url), content_type="application/x-ndjson")
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def get_related_queryset(self):
+        """The page of ``followers``/``following``/``posts``/``liked_posts``."""
+        pk = self.kwargs["pk"]
+        if self.action == "followers":
+            queryset = User.objects.filter(following_edges__followee_id=pk).annotate(
+                followed_at=F("following_edges__created_at"), follow_id=F("following_edges__id"),
+            )
+        elif self.action == "following":
+            queryset = User.objects.filter(follower_edges__follower_id=pk).annotate(
+                followed_at=F("follower_edges__created_at"), follow_id=F("follower_edges__id"),
+            )
+        elif self.action == "posts":
+            queryset = Post.objects.filter(author_id=pk)
+        else:
+            queryset = Post.objects.filter(like_edges__user_id=pk).annotate(
+                liked_at=F("like_edges__created_at"), like_id=F("like_edges__id"),
+            )
+        return self.plan_queryset(queryset)
+
+    def related_page(self):
+        page = self.paginate_queryset(self.get_related_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def arelated_page(self, request, pk=None):
+        return await self.apaginate(self.get_related_queryset())
+
+    afollowers = afollowing = aposts = aliked_posts = arelated_page
+
+    @action(detail=True, methods=["GET"], url_path="followers", permission_classes=[IsAuthenticated],
+            pagination_class=FollowedAtKeysetPagination)
     def followers(self, request, pk=None):
-        user = User.objects.get(pk=pk)
-        followers = user.followers.all()
-        serializer = UserSerializer(followers, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.related_page()
 
-    @action(detail=True, methods=["GET"], url_path="following", permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=["GET"], url_path="following", permission_classes=[IsAuthenticated],
+            pagination_class=FollowedAtKeysetPagination)
     def following(self, request, pk=None):
-        user = User.objects.get(pk=pk)
-        following = user.followings.all()
-        serializer = UserSerializer(following, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.related_page()
 
-    @action(detail=True, methods=["GET"], url_path="posts", permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=["GET"], url_path="posts", permission_classes=[IsAuthenticated],
+            pagination_class=CreatedAtKeysetPagination)
     def posts(self, request, pk=None):
-        user = User.objects.get(pk=pk)
-        posts = user.posts.all()
-        serializer = PostSerializer(posts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.related_page()
 
-    @action(detail=True, methods=["GET"], url_path="liked-posts", permission_classes=[IsAuthenticated])
+    @action(detail=True, methods=["GET"], url_path="liked-posts", permission_classes=[IsAuthenticated],
+            pagination_class=LikedAtKeysetPagination)
     def liked_posts(self, request, pk=None):
-        user = User.objects.get(pk=pk)
-        likes = user.post_like.all()
-        serializer = PostSerializer(likes, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.related_page()